@@ -3,25 +3,53 @@ import pygame.freetype
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GL.shaders import compileShader, compileProgram
+# O wrapper de alto nível do glGetQueryObjectui64v não converte GLuint64 com o NumPy atual; a saída vai num ctypes
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v as glGetQueryObjectui64vRaw
 import numpy as np
-from PIL import Image
 import sys
-import math
+import os
+import argparse
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from geracao import PAINEL_SPECS, SUN_MAX_HEIGHT, PANEL_REFERENCE_POINT, calculate_sun_position
+from simulacao import BatterySimulator
+from malhas import cached_mesh
+from texturas import decode_texture
+from perfil import StageTimer, FrameTimings
+from texto import GlyphAtlas, HudText
+from medicoes import generation_model, load_model, add_data_arguments, open_data
+from gravacao import FrameWriter
+from arranjo import POST_HEIGHT, PanelGrid, update_panel_positions, post_model_matrices, panel_model_matrices, shaded_fractions, frustum_planes, boxes_in_frustum
 
-# Dicionário com as especificações dos painéis
-PAINEL_SPECS = {
-    610: {'size': np.array([2.4, 0.05, 1.3]), 'wattage': 610},
-    330: {'size': np.array([2.0, 0.05, 1.0]), 'wattage': 330},
-    160: {'size': np.array([1.5, 0.05, 0.7]), 'wattage': 160}
-}
+# Limites do arranjo (100 x 100 = 10.000 painéis com o desenho instanciado)
+MAX_ROWS, MAX_COLS = 100, 100
+# Grade de culling (m) e distância a partir da qual as células usam o poste simplificado
+CULL_CELL_SIZE = 20.0; LOD_DISTANCE = 35.0
 
 # --- Shaders ---
+# Uniform block std140 com as matrizes e posições do quadro, enviado uma vez e compartilhado pelos três programas
+FRAME_DATA_BINDING = 0
+FRAME_DATA_BLOCK = """
+layout (std140) uniform FrameData {
+    mat4 projection;
+    mat4 view;
+    mat4 lightSpaceMatrix;
+    vec3 lightPos;
+    vec3 viewPos;
+};
+"""
 VERTEX_SHADER_DEPTH = """
 #version 330 core
+""" + FRAME_DATA_BLOCK + """
 layout (location = 0) in vec3 aPos;
-uniform mat4 lightSpaceMatrix;
+layout (location = 3) in mat4 aInstanceModel;
 uniform mat4 model;
-void main() { gl_Position = lightSpaceMatrix * model * vec4(aPos, 1.0); }
+uniform bool instanced;
+void main() {
+    mat4 M = instanced ? aInstanceModel : model;
+    gl_Position = lightSpaceMatrix * M * vec4(aPos, 1.0);
+}
 """
 FRAGMENT_SHADER_DEPTH = """
 #version 330 core
@@ -29,27 +57,29 @@ void main() { }
 """
 VERTEX_SHADER_SHADOW = """
 #version 330 core
+""" + FRAME_DATA_BLOCK + """
 layout (location = 0) in vec3 aPos;
 layout (location = 1) in vec3 aNormal;
 layout (location = 2) in vec2 aTexCoords;
+layout (location = 3) in mat4 aInstanceModel;
 out vec3 FragPos;
 out vec3 Normal;
 out vec2 TexCoords;
 out vec4 FragPosLightSpace;
-uniform mat4 projection;
-uniform mat4 view;
 uniform mat4 model;
-uniform mat4 lightSpaceMatrix;
+uniform bool instanced;
 void main() {
-    FragPos = vec3(model * vec4(aPos, 1.0));
-    Normal = mat3(transpose(inverse(model))) * aNormal;
+    mat4 M = instanced ? aInstanceModel : model;
+    FragPos = vec3(M * vec4(aPos, 1.0));
+    Normal = mat3(transpose(inverse(M))) * aNormal;
     TexCoords = aTexCoords;
     FragPosLightSpace = lightSpaceMatrix * vec4(FragPos, 1.0);
-    gl_Position = projection * view * model * vec4(aPos, 1.0);
+    gl_Position = projection * view * vec4(FragPos, 1.0);
 }
 """
 FRAGMENT_SHADER_SHADOW = """
 #version 330 core
+""" + FRAME_DATA_BLOCK + """
 out vec4 FragColor;
 in vec3 FragPos;
 in vec3 Normal;
@@ -57,8 +87,6 @@ in vec2 TexCoords;
 in vec4 FragPosLightSpace;
 uniform sampler2D diffuseTexture;
 uniform sampler2D shadowMap;
-uniform vec3 lightPos;
-uniform vec3 viewPos;
 float calculateShadow(vec4 fragPosLightSpace, vec3 normal, vec3 lightDir) {
     vec3 projCoords = fragPosLightSpace.xyz / fragPosLightSpace.w;
     projCoords = projCoords * 0.5 + 0.5;
@@ -84,9 +112,8 @@ void main() {
 """
 VERTEX_SHADER_SUN = """
 #version 330 core
+""" + FRAME_DATA_BLOCK + """
 layout (location = 0) in vec3 aPos;
-uniform mat4 projection;
-uniform mat4 view;
 uniform mat4 model;
 void main() {
     gl_Position = projection * view * model * vec4(aPos, 1.0);
@@ -99,6 +126,27 @@ void main() {
     FragColor = vec4(1.0, 1.0, 0.8, 1.0);
 }
 """
+VERTEX_SHADER_TEXT = """
+#version 330 core
+layout (location = 0) in vec2 aPos;
+layout (location = 1) in vec2 aTexCoord;
+uniform vec2 screenSize;
+out vec2 TexCoord;
+void main() {
+    TexCoord = aTexCoord;
+    gl_Position = vec4(aPos.x / screenSize.x * 2.0 - 1.0, 1.0 - aPos.y / screenSize.y * 2.0, 0.0, 1.0);
+}
+"""
+FRAGMENT_SHADER_TEXT = """
+#version 330 core
+in vec2 TexCoord;
+out vec4 FragColor;
+uniform sampler2D glyphAtlas;
+uniform vec3 textColor;
+void main() {
+    FragColor = vec4(textColor, texture(glyphAtlas, TexCoord).r);
+}
+"""
 # --- Classe da Câmera ---
 class Camera:
     def __init__(self, position=np.array([0.0, 2.5, 8.0]), up=np.array([0.0, 1.0, 0.0]), yaw=-90.0, pitch=0.0):
@@ -136,162 +184,468 @@ class Camera:
         return translation @ rotation
 
 # --- Funções Auxiliares ---
+class GLCallCounter:
+    """Conta as chamadas gl* feitas pelo simulador, e à parte as de desenho (glDraw*); end_frame() fecha a contagem do quadro."""
+    def __init__(self): self.calls = self.draws = 0; self.last_frame = self.last_frame_draws = 0
+    def wrap(self, fn, draw=False):
+        def counted(*args, **kwargs):
+            self.calls += 1; self.draws += draw; return fn(*args, **kwargs)
+        counted.__name__ = getattr(fn, '__name__', 'gl'); return counted
+    def end_frame(self): self.last_frame = self.calls; self.last_frame_draws = self.draws; self.calls = self.draws = 0
+
+GL_CALLS = GLCallCounter()
+def install_gl_call_counter(namespace):
+    for name, fn in list(namespace.items()):
+        if name.startswith('gl') and callable(fn): namespace[name] = GL_CALLS.wrap(fn, draw=name.startswith('glDraw'))
+install_gl_call_counter(globals())
+
+# Etapas do laço principal medidas pelo perfilador; as de GPU também têm uma consulta GL_TIME_ELAPSED
+PROFILE_STAGES = ('eventos', 'geracao', 'placa', 'profundidade', 'sombras', 'sol', 'texto', 'flip')
+PROFILE_GPU_STAGES = ('profundidade', 'sombras', 'sol', 'texto')
+
+class FrameProfiler:
+    """Tempos de CPU (perfil.StageTimer) e de GPU das etapas do quadro, acumulados num perfil.FrameTimings.
+    As consultas GL_TIME_ELAPSED ficam em dois conjuntos alternados: o quadro N mede num e lê o outro, com os
+    resultados do quadro N-1 que a GPU já terminou, então a leitura não trava o laço. Por isso cada quadro só é
+    registrado (e gravado no CSV) no fim do quadro seguinte."""
+    def __init__(self, stages=PROFILE_STAGES, gpu_stages=PROFILE_GPU_STAGES, window=300):
+        self.cpu = StageTimer(); self.gpu_stages = tuple(gpu_stages); self.visible = False
+        try: ids = np.asarray(glGenQueries(2 * len(self.gpu_stages))).ravel()
+        except Exception as e: print(f"Consultas de tempo da GPU indisponíveis: {e}"); self.gpu_stages = (); ids = []
+        self.queries = [dict(zip(self.gpu_stages, ids[k::2])) for k in range(2)]
+        self.timings = FrameTimings(('quadro',) + tuple(stages) + tuple(f'gpu_{name}' for name in self.gpu_stages), window)
+        self.frame = 0; self._query = None; self._used = []; self._pending = [None, None]
+    def stage(self, name):
+        """Fecha a etapa aberta e abre `name` (None só fecha)."""
+        if self._query is not None: glEndQuery(GL_TIME_ELAPSED); self._query = None
+        self.cpu.stage(name)
+        query = self.queries[self.frame % 2].get(name)
+        if query is not None: glBeginQuery(GL_TIME_ELAPSED, query); self._query = query; self._used.append(name)
+    def end_frame(self):
+        self.stage(None); current = self.frame % 2; previous = 1 - current
+        self._pending[current] = (self.cpu.end_frame(), self._used); self._used = []
+        if self._pending[previous] is not None:
+            values, used = self._pending[previous]; self._pending[previous] = None
+            for name in used:
+                query = self.queries[previous][name]
+                if int(glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE)): elapsed = ctypes.c_uint64(); glGetQueryObjectui64vRaw(query, GL_QUERY_RESULT, ctypes.byref(elapsed)); values[f'gpu_{name}'] = elapsed.value / 1e6
+            self.timings.record(self.frame - 1, values)
+        self.frame += 1
+    def toggle_csv(self):
+        if self.timings.csv_path: print(f"Tempos por quadro gravados em {self.timings.stop_csv()}"); return
+        path = time.strftime("perfil_%Y%m%d_%H%M%S.csv"); self.timings.start_csv(path); print(f"Gravando tempos por quadro em {path}")
+    def overlay_lines(self):
+        mean, p95, p99 = self.timings.summary(); lines = ["Perfil (ms)      média     p95     p99"]
+        for i, name in enumerate(self.timings.columns):
+            if not np.isnan(mean[i]): lines.append(f"{name:<16}{mean[i]:>6.2f}  {p95[i]:>6.2f}  {p99[i]:>6.2f}")
+        if self.timings.csv_path: lines.append(f"CSV: {self.timings.csv_path}")
+        return lines
+
+class FrameCapture:
+    """Leitura assíncrona do framebuffer por um anel de pixel buffer objects: o glReadPixels do quadro N só
+    agenda a cópia para um PBO e volta na hora; o PBO é mapeado quando o anel dá a volta, `ring` quadros depois,
+    com a cópia já terminada, e os pixels seguem para o gravacao.FrameWriter, que codifica em outras threads."""
+    def __init__(self, writer, width, height, ring=3):
+        self.writer, self.width, self.height = writer, width, height; self.size = width * height * 4
+        self.pbos = np.asarray(glGenBuffers(ring)).ravel(); self.frames = [None] * ring; self.count = 0
+        for pbo in self.pbos: glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo); glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+    def capture(self, framebuffer=0):
+        """Agenda a leitura do quadro desenhado em `framebuffer` (0 = buffer de trás da janela, antes do flip)."""
+        slot = self.count % len(self.pbos)
+        if self.frames[slot] is not None: self._collect(slot)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, framebuffer); glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[slot])
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0); self.frames[slot] = self.count; self.count += 1
+    def _collect(self, slot):
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[slot])
+        pointer = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.size, GL_MAP_READ_BIT)
+        pixels = np.ctypeslib.as_array(ctypes.cast(pointer, ctypes.POINTER(ctypes.c_ubyte)), shape=(self.height, self.width, 4)).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER); glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.writer.submit(self.frames[slot], pixels); self.frames[slot] = None
+    def finish(self):
+        """Lê o que ainda está no anel, na ordem dos quadros, libera os PBOs e espera os PNGs; devolve quantos foram gravados."""
+        for k in range(len(self.pbos)):
+            slot = (self.count + k) % len(self.pbos)
+            if self.frames[slot] is not None: self._collect(slot)
+        glDeleteBuffers(len(self.pbos), self.pbos)
+        return self.writer.close()
+
 def create_shader_program(vertex_src,fragment_src):
     try:return compileProgram(compileShader(vertex_src,GL_VERTEX_SHADER),compileShader(fragment_src,GL_FRAGMENT_SHADER))
     except Exception as e:print("ERRO:",e);pygame.quit();sys.exit()
-def load_texture(path):
-    try:
-        img=Image.open(path);img_data=img.convert("RGBA").tobytes()
-        texture_id=glGenTextures(1);glBindTexture(GL_TEXTURE_2D,texture_id)
-        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_S,GL_REPEAT);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_T,GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_LINEAR_MIPMAP_LINEAR);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_LINEAR)
-        glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA,img.width,img.height,0,GL_RGBA,GL_UNSIGNED_BYTE,img_data)
-        glGenerateMipmap(GL_TEXTURE_2D);print(f"Textura '{path}' carregada.");return texture_id
-    except Exception as e:print(f"ERRO text.: {path}-{e}");return -1
+
+class ShaderProgram:
+    """Programa criado por create_shader_program com as localizações de todos os uniforms resolvidas na ligação."""
+    def __init__(self, vertex_src, fragment_src):
+        self.id = create_shader_program(vertex_src, fragment_src); self.uniforms = {}
+        for i in range(glGetProgramiv(self.id, GL_ACTIVE_UNIFORMS)):
+            name = glGetActiveUniform(self.id, i)[0]; name = name.decode() if isinstance(name, bytes) else name
+            location = glGetUniformLocation(self.id, name)
+            if location != -1: self.uniforms[name.split('[')[0]] = location
+        block_index = glGetUniformBlockIndex(self.id, "FrameData")
+        if block_index != GL_INVALID_INDEX: glUniformBlockBinding(self.id, block_index, FRAME_DATA_BINDING)
+    def use(self): glUseProgram(self.id)
+    def set_int(self, name, value):
+        location = self.uniforms.get(name, -1)
+        if location != -1: glUniform1i(location, value)
+    def set_vec2(self, name, x, y):
+        location = self.uniforms.get(name, -1)
+        if location != -1: glUniform2f(location, x, y)
+    def set_vec3(self, name, x, y, z):
+        location = self.uniforms.get(name, -1)
+        if location != -1: glUniform3f(location, x, y, z)
+    def set_mat4(self, name, matrix):
+        location = self.uniforms.get(name, -1)
+        if location != -1: glUniformMatrix4fv(location, 1, GL_FALSE, matrix)
+
+class FrameUniforms:
+    """Buffer do bloco FrameData (layout std140: 3 mat4 + 2 vec3 com padding de 16 bytes)."""
+    def __init__(self):
+        self.data = np.zeros(56, dtype=np.float32)
+        self.ubo = glGenBuffers(1); glBindBuffer(GL_UNIFORM_BUFFER, self.ubo); glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_DATA_BINDING, self.ubo)
+    def upload(self, projection, view, light_space_matrix, light_pos, view_pos):
+        d = self.data; d[0:16] = projection.ravel(); d[16:32] = view.ravel(); d[32:48] = light_space_matrix.ravel(); d[48:51] = light_pos; d[52:55] = view_pos
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo); glBufferSubData(GL_UNIFORM_BUFFER, 0, d.nbytes, d)
+def create_solid_texture(color):
+    texture_id=glGenTextures(1);glBindTexture(GL_TEXTURE_2D,texture_id)
+    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_S,GL_REPEAT);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_T,GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_LINEAR_MIPMAP_LINEAR);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAX_LEVEL,0)
+    glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA,1,1,0,GL_RGBA,GL_UNSIGNED_BYTE,np.array(color,dtype=np.uint8));return texture_id
+
+class TextureLoader:
+    """Decodifica as texturas num pool de threads (texturas.decode_texture) e as envia ao OpenGL no laço principal,
+    conforme cada decodificação termina; até lá a textura é um placeholder de 1 pixel."""
+    def __init__(self, start_time, max_workers=None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()); self.pending = {}
+        self.start_time = start_time; self.cached = 0; self.loaded = 0
+    def load(self, path, placeholder_color=(128, 128, 128, 255)):
+        texture_id = create_solid_texture(placeholder_color)
+        self.pending[self.pool.submit(decode_texture, path)] = (texture_id, path); return texture_id
+    def poll(self):
+        for future in [f for f in self.pending if f.done()]:
+            texture_id, path = self.pending.pop(future)
+            try: levels, from_cache = future.result()
+            except Exception as e: print(f"ERRO text.: {path}-{e}"); continue
+            glBindTexture(GL_TEXTURE_2D, texture_id)
+            for i, level in enumerate(levels): glTexImage2D(GL_TEXTURE_2D,i,GL_RGBA,level.shape[1],level.shape[0],0,GL_RGBA,GL_UNSIGNED_BYTE,np.ascontiguousarray(level))
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+            self.loaded += 1; self.cached += from_cache; print(f"Textura '{path}' carregada{' (cache)' if from_cache else ''}.")
+            if not self.pending:
+                print(f"Texturas prontas em {time.perf_counter() - self.start_time:.2f} s ({self.cached}/{self.loaded} do cache)"); self.pool.shutdown(wait=False)
+    def wait(self):
+        """Bloqueia até todas as texturas pendentes estarem no OpenGL (gravação: nenhum quadro sai com placeholders)."""
+        self.poll()
+        while self.pending: time.sleep(0.01); self.poll()
 def perspective(fovy,aspect,near,far):f=1.0/np.tan(np.radians(fovy)/2.);return np.array([[f/aspect,0,0,0],[0,f,0,0],[0,0,(far+near)/(near-far),-1],[0,0,(2*far*near)/(near-far),0]],dtype=np.float32)
 def ortho(left,right,bottom,top,near,far):return np.array([[2/(right-left),0,0,0],[0,2/(top-bottom),0,0],[0,0,-2/(far-near),0],[-(right+left)/(right-left),-(top+bottom)/(top-bottom),-(far+near)/(far-near),1]],dtype=np.float32)
 
 # --- Funções de Geração de Geometria e Lógica ---
-def generate_cylinder_vertices(radius=0.5, height=1.0, sides=16):
-    vertices = []
-    for i in range(sides):
-        angle_i = (i / sides) * 2 * math.pi; angle_j = ((i + 1) / sides) * 2 * math.pi
-        x_i, z_i = radius * math.cos(angle_i), radius * math.sin(angle_i); x_j, z_j = radius * math.cos(angle_j), radius * math.sin(angle_j)
-        vertices.extend([x_i, height/2, z_i, x_i, 0, z_i, i/sides, 1]); vertices.extend([x_i, -height/2, z_i, x_i, 0, z_i, i/sides, 0]); vertices.extend([x_j, height/2, z_j, x_j, 0, z_j, (i+1)/sides, 1])
-        vertices.extend([x_j, height/2, z_j, x_j, 0, z_j, (i+1)/sides, 1]); vertices.extend([x_i, -height/2, z_i, x_i, 0, z_i, i/sides, 0]); vertices.extend([x_j, -height/2, z_j, x_j, 0, z_j, (i+1)/sides, 0])
-    for i in range(sides):
-        angle_i = (i / sides) * 2 * math.pi; angle_j = ((i + 1) / sides) * 2 * math.pi
-        x_i, z_i = radius * math.cos(angle_i), radius * math.sin(angle_i); x_j, z_j = radius * math.cos(angle_j), radius * math.sin(angle_j)
-        vertices.extend([0, height/2, 0, 0, 1, 0, 0.5, 0.5]); vertices.extend([x_i, height/2, z_i, 0, 1, 0, x_i+0.5, z_i+0.5]); vertices.extend([x_j, height/2, z_j, 0, 1, 0, x_j+0.5, z_j+0.5])
-        vertices.extend([0, -height/2, 0, 0, -1, 0, 0.5, 0.5]); vertices.extend([x_j, -height/2, z_j, 0, -1, 0, x_j+0.5, z_j+0.5]); vertices.extend([x_i, -height/2, z_i, 0, -1, 0, x_i+0.5, z_i+0.5])
-    return np.array(vertices, dtype=np.float32)
-
-def generate_sphere_vertices(radius=1.0, sectors=36, stacks=18):
-    vertices_temp = []
-    for i in range(stacks + 1):
-        stack_angle = math.pi / 2 - i * math.pi / stacks; xy = radius * math.cos(stack_angle); y = radius * math.sin(stack_angle)
-        for j in range(sectors + 1):
-            sector_angle = j * 2 * math.pi / sectors
-            x = xy * math.cos(sector_angle); z = xy * math.sin(sector_angle)
-            nx, ny, nz = x/radius, y/radius, z/radius; u, v = j / sectors, i / stacks
-            vertices_temp.extend([x, y, z, nx, ny, nz, u, v])
-    indices = []; final_vertices = []
-    for i in range(stacks):
-        k1 = i * (sectors + 1); k2 = k1 + sectors + 1
-        for j in range(sectors):
-            if i != 0: indices.extend([k1 + j, k2 + j, k1 + j + 1])
-            if i != (stacks - 1): indices.extend([k1 + j + 1, k2 + j, k2 + j + 1])
-    for index in indices:
-        final_vertices.extend(vertices_temp[index*8 : index*8+8])
-    return np.array(final_vertices, dtype=np.float32)
-
 # --- INÍCIO: DEFINIÇÃO GLOBAL DAS CONSTANTES DE GEOMETRIA ---
 CUBE_VERTICES = np.array([-0.5,-0.5,-0.5,0,0,-1,0,0,.5,-0.5,-0.5,0,0,-1,1,0,.5,.5,-0.5,0,0,-1,1,1,.5,.5,-0.5,0,0,-1,1,1,-.5,.5,-0.5,0,0,-1,0,1,-.5,-0.5,-0.5,0,0,-1,0,0,-.5,-0.5,.5,0,0,1,0,0,.5,-0.5,.5,0,0,1,1,0,.5,.5,.5,0,0,1,1,1,.5,.5,.5,0,0,1,1,1,-.5,.5,.5,0,0,1,0,1,-.5,-0.5,.5,0,0,1,0,0,-.5,.5,.5,-1,0,0,1,0,-.5,.5,-0.5,-1,0,0,1,1,-.5,-0.5,-0.5,-1,0,0,0,1,-.5,-0.5,-0.5,-1,0,0,0,1,-.5,-0.5,.5,-1,0,0,0,0,-.5,.5,.5,-1,0,0,1,0,.5,.5,.5,1,0,0,1,0,.5,.5,-0.5,1,0,0,1,1,.5,-0.5,-0.5,1,0,0,0,1,.5,-0.5,-0.5,1,0,0,0,1,.5,-0.5,.5,1,0,0,0,0,.5,.5,.5,1,0,0,1,0,-.5,-0.5,-0.5,0,-1,0,0,1,.5,-0.5,-0.5,0,-1,0,1,1,.5,-0.5,.5,0,-1,0,1,0,.5,-0.5,.5,0,-1,0,1,0,-.5,-0.5,.5,0,-1,0,0,0,-.5,-0.5,-0.5,0,-1,0,0,1,-.5,.5,-0.5,0,1,0,0,1,.5,.5,-0.5,0,1,0,1,1,.5,.5,.5,0,1,0,1,0,.5,.5,.5,0,1,0,1,0,-.5,.5,.5,0,1,0,0,0,-.5,.5,-0.5,0,1,0,0,1],dtype=np.float32)
 PLANE_VERTICES = np.array([[50.,0.,50.,0.,1.,0.,50.,50.],[-50.,0.,50.,0.,1.,0.,0.,50.],[-50.,0.,-50.,0.,1.,0.,0.,0.],[50.,0.,50.,0.,1.,0.,50.,50.],[-50.,0.,-50.,0.,1.,0.,0.,0.],[50.,0.,-50.,0.,1.,0.,50.,0.]],dtype=np.float32)
-CYLINDER_VERTICES = generate_cylinder_vertices()
-SPHERE_VERTICES = generate_sphere_vertices()
+# Malhas indexadas (vértices, índices) vindas do cache .npy de malhas.py
+CYLINDER_VERTICES, CYLINDER_INDICES = cached_mesh('cylinder', radius=0.5, height=1.0, sides=16)
+SPHERE_VERTICES, SPHERE_INDICES = cached_mesh('sphere', radius=1.0, sectors=36, stacks=18)
+# Poste simplificado das células distantes
+CYLINDER_LOD_VERTICES, CYLINDER_LOD_INDICES = cached_mesh('cylinder', radius=0.5, height=1.0, sides=6)
 # --- FIM: DEFINIÇÃO GLOBAL DAS CONSTANTES DE GEOMETRIA ---
 
-def calculate_sun_position(hour,radius=25.,height=30.):
-    hour_angle=(hour-6.)/12.*math.pi
-    if not(0<=hour_angle<=math.pi):return np.array([0.,-height,0.],dtype=np.float32)
-    pos_x=10.;pos_y=math.sin(hour_angle)*height;pos_z=math.cos(hour_angle)*radius
-    return np.array([pos_x,pos_y,pos_z],dtype=np.float32)
+def create_mesh_vao(vertices, indices=None):
+    vao=glGenVertexArrays(1);glBindVertexArray(vao)
+    vbo=glGenBuffers(1);glBindBuffer(GL_ARRAY_BUFFER,vbo);glBufferData(GL_ARRAY_BUFFER,vertices.nbytes,vertices,GL_STATIC_DRAW)
+    if indices is not None: ebo=glGenBuffers(1);glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,ebo);glBufferData(GL_ELEMENT_ARRAY_BUFFER,indices.nbytes,indices,GL_STATIC_DRAW)
+    glEnableVertexAttribArray(0);glVertexAttribPointer(0,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(0));glEnableVertexAttribArray(1);glVertexAttribPointer(1,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(12));glEnableVertexAttribArray(2);glVertexAttribPointer(2,2,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(24))
+    return vao
+
+def attach_instance_matrices(vao, instance_vbo):
+    # Atributos 3..6 = as 4 colunas da mat4 do modelo, avançando uma vez por instância
+    glBindVertexArray(vao); glBindBuffer(GL_ARRAY_BUFFER, instance_vbo)
+    for i in range(4):
+        glEnableVertexAttribArray(3+i); glVertexAttribPointer(3+i,4,GL_FLOAT,GL_FALSE,64,ctypes.c_void_p(16*i)); glVertexAttribDivisor(3+i,1)
+    glBindVertexArray(0)
 
 def setup_geometry():
     # Agora a função usa as constantes globais para criar os VAOs
-    cubeVAO=glGenVertexArrays(1);glBindVertexArray(cubeVAO)
-    cubeVBO=glGenBuffers(1);glBindBuffer(GL_ARRAY_BUFFER,cubeVBO);glBufferData(GL_ARRAY_BUFFER,CUBE_VERTICES.nbytes,CUBE_VERTICES,GL_STATIC_DRAW)
-    glEnableVertexAttribArray(0);glVertexAttribPointer(0,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(0));glEnableVertexAttribArray(1);glVertexAttribPointer(1,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(12));glEnableVertexAttribArray(2);glVertexAttribPointer(2,2,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(24))
-    planeVAO=glGenVertexArrays(1);glBindVertexArray(planeVAO)
-    planeVBO=glGenBuffers(1);glBindBuffer(GL_ARRAY_BUFFER,planeVBO);glBufferData(GL_ARRAY_BUFFER,PLANE_VERTICES.nbytes,PLANE_VERTICES,GL_STATIC_DRAW)
-    glEnableVertexAttribArray(0);glVertexAttribPointer(0,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(0));glEnableVertexAttribArray(1);glVertexAttribPointer(1,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(12));glEnableVertexAttribArray(2);glVertexAttribPointer(2,2,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(24))
-    cylinderVAO=glGenVertexArrays(1);glBindVertexArray(cylinderVAO)
-    cylinderVBO=glGenBuffers(1);glBindBuffer(GL_ARRAY_BUFFER,cylinderVBO);glBufferData(GL_ARRAY_BUFFER,CYLINDER_VERTICES.nbytes,CYLINDER_VERTICES,GL_STATIC_DRAW)
-    glEnableVertexAttribArray(0);glVertexAttribPointer(0,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(0));glEnableVertexAttribArray(1);glVertexAttribPointer(1,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(12));glEnableVertexAttribArray(2);glVertexAttribPointer(2,2,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(24))
-    sphereVAO=glGenVertexArrays(1);glBindVertexArray(sphereVAO)
-    sphereVBO=glGenBuffers(1);glBindBuffer(GL_ARRAY_BUFFER,sphereVBO);glBufferData(GL_ARRAY_BUFFER,SPHERE_VERTICES.nbytes,SPHERE_VERTICES,GL_STATIC_DRAW)
-    glEnableVertexAttribArray(0);glVertexAttribPointer(0,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(0));glEnableVertexAttribArray(1);glVertexAttribPointer(1,3,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(12));glEnableVertexAttribArray(2);glVertexAttribPointer(2,2,GL_FLOAT,GL_FALSE,32,ctypes.c_void_p(24))
+    cubeVAO=create_mesh_vao(CUBE_VERTICES); planeVAO=create_mesh_vao(PLANE_VERTICES)
+    cylinderVAO=create_mesh_vao(CYLINDER_VERTICES, CYLINDER_INDICES); sphereVAO=create_mesh_vao(SPHERE_VERTICES, SPHERE_INDICES)
     return cubeVAO, planeVAO, cylinderVAO, sphereVAO
 
-def update_panel_positions(rows, cols):
-    positions = []; spacing_x, spacing_z = 4.0, 5.0
-    for i in range(rows):
-        for j in range(cols):
-            x = (j - (cols - 1) / 2.0) * spacing_x; z = (i - (rows - 1) / 2.0) * spacing_z - 10.0
-            positions.append(np.array([x, 0, z]))
-    return positions
-
-def update_sign_texture(surface, font, texture_id, power_kw):
-    temp_surface = pygame.Surface(surface.get_size()); background_color = (5, 5, 15); led_color = (150, 240, 255)
-    temp_surface.fill(background_color)
+class InstanceBuffers:
+    """VBOs de instâncias de um passe (postes próximos, postes simplificados e painéis) e os VAOs que os leem,
+    com as contagens que draw_scene desenha; `uploaded` é a chave do conjunto visível enviado por último."""
+    def __init__(self):
+        self.post_vbo, self.post_lod_vbo, self.panel_vbo = glGenBuffers(3)
+        self.cylinder_vao = create_mesh_vao(CYLINDER_VERTICES, CYLINDER_INDICES); attach_instance_matrices(self.cylinder_vao, self.post_vbo)
+        self.cylinder_lod_vao = create_mesh_vao(CYLINDER_LOD_VERTICES, CYLINDER_LOD_INDICES); attach_instance_matrices(self.cylinder_lod_vao, self.post_lod_vbo)
+        self.cube_vao = create_mesh_vao(CUBE_VERTICES); attach_instance_matrices(self.cube_vao, self.panel_vbo)
+        self.post_count = self.post_lod_count = self.count = 0; self.visible_cells = 0; self.uploaded = None
+
+class PanelInstances:
+    """Matrizes de modelo por instância de postes e painéis, ordenadas pelas células de uma grade espacial.
+    As matrizes só são recalculadas quando o layout, a inclinação, o azimute ou o tipo mudam; cada passe chama
+    prepare() com a sua matriz de volume (câmera ou luz) e só as células dentro dele vão para os VBOs do passe.
+    Cada passe tem os seus VBOs, então alternar luz e câmera no mesmo quadro não reenvia nada."""
+    def __init__(self):
+        self.passes = {}; self.total = 0; self.total_cells = 0
+        self._positions = None; self._state = None; self._version = 0
+    def update(self, panel_positions, panel_specs, panel_tilt, panel_azimuth):
+        # update_panel_positions devolve um array novo a cada mudança, então a identidade basta para detectar o layout
+        state = (panel_specs['wattage'], panel_tilt, panel_azimuth)
+        if panel_positions is self._positions and state == self._state: return False
+        if panel_positions is not self._positions:
+            grid = PanelGrid(panel_positions, CULL_CELL_SIZE); first, cell_min, cell_max = grid.occupied_cells(panel_positions)
+            self._order = grid.order; self._instance_cell = np.repeat(np.arange(len(first)), np.diff(np.append(first, len(panel_positions))))
+            self._cell_min, self._cell_max = cell_min, cell_max
+            self._posts = post_model_matrices(panel_positions[self._order])
+        # Caixa de cada célula: xz das posições com folga do maior painel girado, y do chão ao topo do painel
+        radius = np.linalg.norm(panel_specs['size']) / 2.
+        self.cell_box_min = np.column_stack([self._cell_min[:, 0] - radius, np.zeros(len(self._cell_min)), self._cell_min[:, 1] - radius])
+        self.cell_box_max = np.column_stack([self._cell_max[:, 0] + radius, np.full(len(self._cell_max), POST_HEIGHT + radius), self._cell_max[:, 1] + radius])
+        self._panels = panel_model_matrices(panel_positions[self._order], panel_specs['size'], panel_tilt, panel_azimuth)
+        self.total = len(panel_positions); self.total_cells = len(self._cell_min)
+        self._positions = panel_positions; self._state = state; self._version += 1
+        return True
+    def prepare(self, name, clip_matrix, eye=None):
+        """InstanceBuffers do passe `name`, com as instâncias das células dentro do volume de clip_matrix (view @ projection).
+        Com eye, células a mais de LOD_DISTANCE usam o poste simplificado. Só reenvia quando o conjunto do passe muda."""
+        buffers = self.passes.get(name)
+        if buffers is None: buffers = self.passes[name] = InstanceBuffers()
+        visible = boxes_in_frustum(frustum_planes(clip_matrix), self.cell_box_min, self.cell_box_max)
+        far = np.zeros_like(visible)
+        if eye is not None: far = visible & (np.linalg.norm((self.cell_box_min + self.cell_box_max) / 2. - eye, axis=1) > LOD_DISTANCE)
+        key = (self._version, visible.tobytes(), far.tobytes())
+        if key == buffers.uploaded: return buffers
+        visible_instances = visible[self._instance_cell]; far_instances = far[self._instance_cell]
+        for vbo, matrices in ((buffers.post_vbo, self._posts[visible_instances & ~far_instances]), (buffers.post_lod_vbo, self._posts[far_instances]), (buffers.panel_vbo, self._panels[visible_instances])):
+            glBindBuffer(GL_ARRAY_BUFFER, vbo); glBufferData(GL_ARRAY_BUFFER, matrices.nbytes, matrices if len(matrices) else None, GL_DYNAMIC_DRAW)
+        buffers.count = int(visible_instances.sum()); buffers.post_lod_count = int(far_instances.sum()); buffers.post_count = buffers.count - buffers.post_lod_count
+        buffers.visible_cells = int(visible.sum()); buffers.uploaded = key
+        return buffers
+
+def create_depth_texture(width, height):
+    depthMap=glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D,depthMap); glTexImage2D(GL_TEXTURE_2D,0,GL_DEPTH_COMPONENT,width,height,0,GL_DEPTH_COMPONENT,GL_FLOAT,None)
+    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_NEAREST);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_S,GL_CLAMP_TO_BORDER);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_T,GL_CLAMP_TO_BORDER)
+    borderColor=np.array([1.,1.,1.,1.],dtype=np.float32);glTexParameterfv(GL_TEXTURE_2D,GL_TEXTURE_BORDER_COLOR,borderColor)
+    return depthMap
+
+class ShadowMapCache:
+    """Cache LRU de shadow maps indexado por (hora do sol, layout, inclinação, azimute, tipo de painel).
+    acquire() devolve a textura da chave e se ela precisa ser desenhada; com a mesma chave do quadro anterior o passo de profundidade é pulado."""
+    def __init__(self, width, height, capacity=8):
+        self.width, self.height, self.capacity = width, height, capacity
+        self.maps = OrderedDict(); self.current_key = None; self.hits = 0; self.misses = 0
+        self.fbo = glGenFramebuffers(1); glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glDrawBuffer(GL_NONE); glReadBuffer(GL_NONE); glBindFramebuffer(GL_FRAMEBUFFER, 0)
+    def acquire(self, key):
+        if key in self.maps:
+            self.maps.move_to_end(key)
+            if key != self.current_key: self.hits += 1; self.current_key = key
+            return self.maps[key], False
+        # Na falta, reaproveita a textura menos usada em vez de criar/apagar texturas de 16 MB
+        texture = self.maps.popitem(last=False)[1] if len(self.maps) >= self.capacity else create_depth_texture(self.width, self.height)
+        self.maps[key] = texture; self.current_key = key; self.misses += 1
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo); glFramebufferTexture2D(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_TEXTURE_2D, texture, 0)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER)!=GL_FRAMEBUFFER_COMPLETE:print("ERRO FBO!");pygame.quit();sys.exit()
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        return texture, True
+    def clear(self):
+        if self.maps: glDeleteTextures(list(self.maps.values()))
+        self.maps.clear(); self.current_key = None
+
+SIGN_BACKGROUND_COLOR = (5, 5, 15); SIGN_LED_COLOR = (150, 240, 255)
+
+def render_sign_bitmap(font, width, height, power_text):
+    """Desenha a placa como matriz de LEDs e devolve o RGBA (altura, largura, 4) já invertido para o glTexSubImage2D."""
+    temp_surface = pygame.Surface((width, height)); temp_surface.fill(SIGN_BACKGROUND_COLOR)
     title_text = "GERACAO"; title_rect = font.get_rect(title_text, size=34); title_rect.centerx = temp_surface.get_rect().centerx; title_rect.top = 22
-    font.render_to(temp_surface, title_rect, title_text, led_color)
-    power_text = f"{power_kw:.2f} kW"; power_rect = font.get_rect(power_text, size=42); power_rect.centerx = temp_surface.get_rect().centerx; power_rect.top = 60
-    font.render_to(temp_surface, power_rect, power_text, led_color)
-    surface.fill(background_color)
-    grid_size = 2; led_radius = 1
-    for x in range(0, surface.get_width(), grid_size):
-        for y in range(0, surface.get_height(), grid_size):
-            pixel_color = temp_surface.get_at((x, y))
-            if pixel_color != background_color: pygame.draw.circle(surface, led_color, (x, y), led_radius)
-    texture_data = pygame.image.tostring(surface, "RGBA", True)
-    glBindTexture(GL_TEXTURE_2D, texture_id); glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, surface.get_width(), surface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
-
-def draw_scene(shader, vao_dict, tex_dict, panel_positions, panel_specs, panel_tilt, panel_azimuth, battery_percentage):
+    font.render_to(temp_surface, title_rect, title_text, SIGN_LED_COLOR)
+    power_rect = font.get_rect(power_text, size=42); power_rect.centerx = temp_surface.get_rect().centerx; power_rect.top = 60
+    font.render_to(temp_surface, power_rect, power_text, SIGN_LED_COLOR)
+    # Amostra o texto a cada 2 pixels; cada LED aceso é o bloco 2x2 que pygame.draw.circle(raio 1) pinta acima e à esquerda do centro
+    grid_size = 2; pixels = pygame.surfarray.pixels3d(temp_surface)
+    lit = np.zeros((width, height), dtype=bool)
+    lit[::grid_size, ::grid_size] = np.any(pixels[::grid_size, ::grid_size] != SIGN_BACKGROUND_COLOR, axis=-1); del pixels
+    lit[:-1, :] |= lit[1:, :].copy(); lit[:, :-1] |= lit[:, 1:].copy()
+    bitmap = np.empty((height, width, 4), dtype=np.uint8); bitmap[..., 3] = 255
+    bitmap[..., :3] = np.where(lit.T[::-1, :, None], SIGN_LED_COLOR, SIGN_BACKGROUND_COLOR)
+    return bitmap
+
+class SignTexture:
+    """Textura da placa de geração: só é redesenhada e reenviada quando o texto exibido muda, com um LRU dos bitmaps recentes."""
+    def __init__(self, font, width, height, cache_size=64):
+        self.font, self.width, self.height, self.cache_size = font, width, height, cache_size
+        self.bitmaps = OrderedDict(); self.text = None
+        self.texture_id = glGenTextures(1); glBindTexture(GL_TEXTURE_2D, self.texture_id); glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST); glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+    def update(self, power_kw):
+        power_text = f"{power_kw:.2f} kW"
+        if power_text == self.text: return False
+        bitmap = self.bitmaps.pop(power_text, None)
+        if bitmap is None:
+            bitmap = render_sign_bitmap(self.font, self.width, self.height, power_text)
+            if len(self.bitmaps) >= self.cache_size: self.bitmaps.popitem(last=False)
+        self.bitmaps[power_text] = bitmap; self.text = power_text
+        glBindTexture(GL_TEXTURE_2D, self.texture_id); glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, bitmap)
+        return True
+
+def draw_scene(shader, vao_dict, tex_dict, instances, battery_percentage, draw_charge_bar=True):
     glActiveTexture(GL_TEXTURE0); glBindTexture(GL_TEXTURE_2D, tex_dict['grass']); glBindVertexArray(vao_dict['plane'])
-    model = np.identity(4, dtype=np.float32); glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(PLANE_VERTICES))
-    panel_size = panel_specs['size']
-    for position in panel_positions:
-        post_height = 2.
-        glBindVertexArray(vao_dict['cylinder']); glBindTexture(GL_TEXTURE_2D, tex_dict['metal'])
-        base_trans = np.identity(4, dtype=np.float32); base_trans[3, 0:3] = position
-        sup_trans = np.identity(4, dtype=np.float32); sup_trans[3, 1] = post_height / 2.
-        sup_scale = np.diag([.15, post_height, .15, 1.]).astype(np.float32)
-        model = sup_scale @ sup_trans @ base_trans
-        glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CYLINDER_VERTICES) // 8)
-        glBindVertexArray(vao_dict['cube']); glBindTexture(GL_TEXTURE_2D, tex_dict['panel'])
-        panel_trans = np.identity(4, dtype=np.float32); panel_trans[3, 1] = post_height
-        tilt_rad = np.radians(panel_tilt); c_tilt, s_tilt = np.cos(tilt_rad), np.sin(tilt_rad)
-        tilt_rot = np.array([[1, 0, 0, 0], [0, c_tilt, -s_tilt, 0], [0, s_tilt, c_tilt, 0], [0, 0, 0, 1]], dtype=np.float32)
-        azimuth_rad = np.radians(panel_azimuth); c_az, s_az = np.cos(azimuth_rad), np.sin(azimuth_rad)
-        azimuth_rot = np.array([[c_az, 0, s_az, 0], [0, 1, 0, 0], [-s_az, 0, c_az, 0], [0, 0, 0, 1]], dtype=np.float32)
-        panel_scale = np.diag(list(panel_size) + [1.]).astype(np.float32)
-        model = panel_scale @ tilt_rot @ azimuth_rot @ panel_trans @ base_trans
-        glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+    model = np.identity(4, dtype=np.float32); shader.set_mat4("model", model); glDrawArrays(GL_TRIANGLES, 0, len(PLANE_VERTICES))
+    # Postes e painéis: um desenho instanciado por malha, com as matrizes das células visíveis já no VBO de instâncias
+    shader.set_int("instanced", 1); glBindTexture(GL_TEXTURE_2D, tex_dict['metal'])
+    if instances.post_count: glBindVertexArray(instances.cylinder_vao); glDrawElementsInstanced(GL_TRIANGLES, len(CYLINDER_INDICES), GL_UNSIGNED_INT, None, instances.post_count)
+    if instances.post_lod_count: glBindVertexArray(instances.cylinder_lod_vao); glDrawElementsInstanced(GL_TRIANGLES, len(CYLINDER_LOD_INDICES), GL_UNSIGNED_INT, None, instances.post_lod_count)
+    if instances.count: glBindVertexArray(instances.cube_vao); glBindTexture(GL_TEXTURE_2D, tex_dict['panel']); glDrawArraysInstanced(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8, instances.count)
+    shader.set_int("instanced", 0)
     glBindVertexArray(vao_dict['cube']); glBindTexture(GL_TEXTURE_2D, tex_dict['metal'])
     battery_pos = np.array([2.5, 1.0, 1.0])
     base_trans = np.identity(4, dtype=np.float32); base_trans[3, 0:3] = battery_pos
     scale = np.diag([1.5, 2.0, 1.0, 1.0]).astype(np.float32); model = scale @ base_trans
-    glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+    shader.set_mat4("model", model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
     BAR_MAX_HEIGHT = 1.8; BAR_WIDTH = 0.4
     glBindTexture(GL_TEXTURE_2D, tex_dict['red']); bar_pos = battery_pos + np.array([0, 0, 0.51])
     trans_mat = np.identity(4, dtype=np.float32); trans_mat[3, 0:3] = bar_pos
     scale_mat = np.diag([BAR_WIDTH, BAR_MAX_HEIGHT, 0.1, 1.0]).astype(np.float32); model = scale_mat @ trans_mat
-    glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
-    if battery_percentage > 0:
+    shader.set_mat4("model", model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+    # A barra verde fica rente à face do gabinete; o passo de profundidade a omite para que o shadow map não dependa da carga
+    if draw_charge_bar and battery_percentage > 0:
         glBindTexture(GL_TEXTURE_2D, tex_dict['green'])
         current_bar_height = BAR_MAX_HEIGHT * (battery_percentage / 100.0)
         y_offset = (current_bar_height - BAR_MAX_HEIGHT) / 2.0; bar_pos_green = bar_pos + np.array([0, y_offset, 0.01])
         trans_mat_green = np.identity(4, dtype=np.float32); trans_mat_green[3, 0:3] = bar_pos_green
         scale_mat_green = np.diag([BAR_WIDTH, current_bar_height, 0.1, 1.0]).astype(np.float32); model = scale_mat_green @ trans_mat_green
-        glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+        shader.set_mat4("model", model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
     glBindVertexArray(vao_dict['cube']); sign_pos = np.array([0, 0, 2.0]); glBindTexture(GL_TEXTURE_2D, tex_dict['metal'])
     post_trans = np.identity(4, dtype=np.float32); post_trans[3, 0:3] = sign_pos; post_trans[3, 1] = 1.25
     post_scale = np.diag([0.2, 2.5, 0.2, 1.0]).astype(np.float32); model = post_scale @ post_trans
-    glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+    shader.set_mat4("model", model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
     glBindTexture(GL_TEXTURE_2D, tex_dict['sign'])
     board_trans = np.identity(4, dtype=np.float32); board_trans[3, 0:3] = sign_pos; board_trans[3, 1] = 3.2
     board_scale = np.diag([3.0, 1.5, 0.2, 1.0]).astype(np.float32); model = board_scale @ board_trans
-    glUniformMatrix4fv(glGetUniformLocation(shader, "model"), 1, GL_FALSE, model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+    shader.set_mat4("model", model); glDrawArrays(GL_TRIANGLES, 0, len(CUBE_VERTICES) // 8)
+
+class HudRenderer:
+    """HUD em perfil core: os glifos da fonte ficam num atlas (texto.GlyphAtlas) numa textura GL_R8, e os quads de
+    todas as linhas (texto.HudText) num VBO dinâmico, reenviado só quando alguma linha muda; o HUD inteiro sai numa
+    única chamada de desenho. As posições são em pixels com y para baixo, como no pygame."""
+    def __init__(self, font, color=(1.0, 1.0, 1.0)):
+        self.atlas = GlyphAtlas(font); self.text = HudText(self.atlas); self.color = color; self.count = 0
+        self.shader = ShaderProgram(VERTEX_SHADER_TEXT, FRAGMENT_SHADER_TEXT); self.shader.use(); self.shader.set_int("glyphAtlas", 0)
+        height, width = self.atlas.image.shape
+        self.texture = glGenTextures(1); glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST); glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE); glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1); glTexImage2D(GL_TEXTURE_2D, 0, GL_R8, width, height, 0, GL_RED, GL_UNSIGNED_BYTE, self.atlas.image); glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+        self.vao = glGenVertexArrays(1); self.vbo = glGenBuffers(1)
+        glBindVertexArray(self.vao); glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(0)); glEnableVertexAttribArray(0)
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(8)); glEnableVertexAttribArray(1)
+        glBindVertexArray(0)
+    def draw(self, screen_width, screen_height):
+        if self.text.dirty:
+            vertices = self.text.vertices(); self.count = len(vertices)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo); glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices if self.count else None, GL_DYNAMIC_DRAW)
+        if not self.count: return
+        glDisable(GL_DEPTH_TEST); glEnable(GL_BLEND); glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.shader.use(); self.shader.set_vec2("screenSize", screen_width, screen_height); self.shader.set_vec3("textColor", *self.color)
+        glActiveTexture(GL_TEXTURE0); glBindTexture(GL_TEXTURE_2D, self.texture)
+        glBindVertexArray(self.vao); glDrawArrays(GL_TRIANGLES, 0, self.count)
+        glDisable(GL_BLEND); glEnable(GL_DEPTH_TEST)
+
+class FarmRenderer:
+    """Recursos de GL da cena (shaders, UBO, texturas, VAOs, instâncias, mapas de sombra e placa) e os passes de
+    desenho de um quadro. A janela do simulador e o benchmark sem janela (desempenho.py) desenham por aqui."""
+    SIGN_WIDTH, SIGN_HEIGHT = 256, 128
+    def __init__(self, sign_font, texture_loader, shadow_size=(2048, 2048)):
+        self.shaders={'depth':ShaderProgram(VERTEX_SHADER_DEPTH,FRAGMENT_SHADER_DEPTH),'shadow':ShaderProgram(VERTEX_SHADER_SHADOW,FRAGMENT_SHADER_SHADOW), 'sun': ShaderProgram(VERTEX_SHADER_SUN, FRAGMENT_SHADER_SUN)}
+        self.frame_uniforms=FrameUniforms(); self.sign = SignTexture(sign_font, self.SIGN_WIDTH, self.SIGN_HEIGHT)
+        # As texturas decodificam em segundo plano; o primeiro quadro sai com placeholders
+        texture_dir=os.path.dirname(os.path.abspath(__file__))
+        self.textures={'grass':texture_loader.load(os.path.join(texture_dir,"grass_texture.png"),(60,110,40,255)),'panel':texture_loader.load(os.path.join(texture_dir,"solar_cell_texture.png"),(20,30,70,255)), 'metal':texture_loader.load(os.path.join(texture_dir,"solar_panel_metallic.png"),(150,150,155,255)), 'sign': self.sign.texture_id, 'red': create_solid_texture((200,30,30,255)), 'green': create_solid_texture((40,200,60,255))}
+        cube_vao, plane_vao, cylinder_vao, sphere_vao = setup_geometry()
+        self.vaos = {'cube': cube_vao, 'plane': plane_vao, 'cylinder': cylinder_vao, 'sphere': sphere_vao}
+        self.panel_instances=PanelInstances(); self.shadow_size=shadow_size; self.shadow_maps=ShadowMapCache(*shadow_size)
+        self.shaders['shadow'].use(); self.shaders['shadow'].set_int("diffuseTexture",0); self.shaders['shadow'].set_int("shadowMap",1)
+        glEnable(GL_DEPTH_TEST)
+    def reset_caches(self):
+        """Esvazia os caches de mapas de sombra e de bitmaps da placa, para uma medida começar do zero."""
+        self.shadow_maps.clear(); self.sign.bitmaps.clear(); self.sign.text = None
+    def draw(self, camera, light_pos, shadow_key, battery_percentage, viewport, framebuffer=0, stage=None):
+        """Passes de profundidade (só se o mapa de sombras de shadow_key não estiver no cache), sombras e sol no
+        framebuffer dado; stage(nome), se houver, marca o início de cada passe para o perfilador."""
+        stage = stage or (lambda name: None); shaders, vaos, textures, panel_instances = self.shaders, self.vaos, self.textures, self.panel_instances
+        projection=perspective(45.0,viewport[0]/viewport[1],0.1,100.0); view=camera.get_view_matrix()
+        # Com o sol a pino (efemérides nos trópicos) o vetor 'up' da luz não pode ser o eixo y
+        lightProjection=ortho(-40.0,40.0,-40.0,40.0,1.0,80.0); lightView=camera._look_at(light_pos,np.array([0.,0.,0.]),np.array([0.,1.,0.]) if abs(light_pos[0])+abs(light_pos[2])>1e-3 else np.array([1.,0.,0.]))
+        lightSpaceMatrix=lightView@lightProjection
+        self.frame_uniforms.upload(projection, view, lightSpaceMatrix, light_pos, camera.position)
+        stage('profundidade')
+        # O shadow map só é redesenhado quando o sol ou a geometria mudam e a combinação não está no cache
+        depthMap,shadow_dirty=self.shadow_maps.acquire(shadow_key)
+        if shadow_dirty:
+            shaders['depth'].use()
+            glViewport(0,0,*self.shadow_size);glBindFramebuffer(GL_FRAMEBUFFER,self.shadow_maps.fbo);glClear(GL_DEPTH_BUFFER_BIT)
+            draw_scene(shaders['depth'],vaos,textures,panel_instances.prepare('luz',lightSpaceMatrix),battery_percentage,draw_charge_bar=False)
+        glBindFramebuffer(GL_FRAMEBUFFER,framebuffer)
+
+        stage('sombras')
+        glViewport(0,0,*viewport); glClearColor(0.5,0.8,1.0,1.0); glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+        shaders['shadow'].use()
+        glActiveTexture(GL_TEXTURE1);glBindTexture(GL_TEXTURE_2D,depthMap)
+        draw_scene(shaders['shadow'],vaos,textures,panel_instances.prepare('camera',view@projection,camera.position),battery_percentage)
+
+        stage('sol')
+        glDepthMask(GL_FALSE)
+        shaders['sun'].use()
+        trans_mat = np.identity(4, dtype=np.float32); trans_mat[3, 0:3] = light_pos
+        scale_mat = np.diag([2.0, 2.0, 2.0, 1.0]).astype(np.float32)
+        model_sun = scale_mat @ trans_mat
+        shaders['sun'].set_mat4("model", model_sun)
+        glBindVertexArray(vaos['sphere'])
+        glDrawElements(GL_TRIANGLES, len(SPHERE_INDICES), GL_UNSIGNED_INT, None)
+        glDepthMask(GL_TRUE)
+
+class SolarFrame:
+    """Sol, sombreamento e geração de um quadro, com a mesma lógica na janela, no benchmark (desempenho.py) e na
+    gravação (gravacao.py). update devolve o próprio objeto com light_pos, shadow_key, shading, lit_panels e power_kw;
+    generation_kw(horas) é a geração do arranjo do quadro para a bateria."""
+    def __init__(self, sun=None, generation=None):
+        self.sun = sun; self.generation = generation or generation_model(sun=sun); self.shadow_key = None
+    def update(self, absolute_hour, rows, cols, panel_positions, panel_type, tilt, azimuth):
+        # Luz, sombras e sombreamento usam a hora arredondada ao minuto, para que os caches continuem valendo com o relógio andando
+        hour = round(absolute_hour * 60.) / 60.
+        # Com efemérides o sol muda de um dia para outro, então a chave das sombras usa a hora absoluta
+        self.sun_hour = hour % 24. if self.sun is None else hour
+        self.light_pos = calculate_sun_position(self.sun_hour, height=SUN_MAX_HEIGHT) if self.sun is None else self.sun.position(self.sun_hour)
+        specs = PAINEL_SPECS[panel_type]; shadow_key = (self.sun_hour, rows, cols, tilt, azimuth, panel_type)
+        if shadow_key != self.shadow_key:
+            # Só recalcula o sombreamento entre fileiras quando o sol ou a geometria mudam; de noite não há o que sombrear
+            self.shading = shaded_fractions(panel_positions, specs['size'], tilt, azimuth, self.light_pos - PANEL_REFERENCE_POINT) if self.light_pos[1] > 0 else np.zeros(len(panel_positions))
+            self.shadow_key = shadow_key
+        # Todos os painéis têm a mesma orientação, então a potência por painel é igual e basta descontar a área sombreada
+        self.lit_panels = len(panel_positions) - self.shading.sum(); self.panel = (tilt, azimuth, specs['wattage'])
+        # Geração e consumo medidos são consultados no relógio absoluto (dia * 24 + hora), direto no cache mapeado
+        self.power_kw = float(self.generation_kw(np.array([absolute_hour]))[0])
+        return self
+    def generation_kw(self, hours):
+        """Geração (kW) do arranjo do último update nas horas dadas; o sombreamento do quadro vale para todas elas."""
+        return self.generation(hours, *self.panel, self.lit_panels)
 
-def render_text(text, font, pos, screen_width, screen_height):
-    glMatrixMode(GL_PROJECTION);glPushMatrix();glLoadIdentity(); glOrtho(0,screen_width,0,screen_height,-1,1)
-    glMatrixMode(GL_MODELVIEW);glPushMatrix();glLoadIdentity(); glDisable(GL_DEPTH_TEST);glEnable(GL_BLEND);glBlendFunc(GL_SRC_ALPHA,GL_ONE_MINUS_SRC_ALPHA)
-    font.render_to(pygame.display.get_surface(),pos,text,(255,255,255))
-    glDisable(GL_BLEND);glEnable(GL_DEPTH_TEST); glMatrixMode(GL_PROJECTION);glPopMatrix(); glMatrixMode(GL_MODELVIEW);glPopMatrix()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador da fazenda solar")
+    add_data_arguments(parser)
+    parser.add_argument('--gravar', help="grava cada quadro como PNG neste diretório (leitura assíncrona por PBOs); F5 liga/desliga durante a execução")
+    parser.add_argument('--minutos-por-quadro', type=float, help="passo fixo: cada quadro avança exatamente estes minutos simulados, sem o limite de 60 quadros/s")
+    parser.add_argument('--horas', type=float, help="encerra depois destas horas simuladas")
+    args = parser.parse_args(argv)
+    weather, load, sun, generation = open_data(args, parser)
 
-def main():
+    startup_time=time.perf_counter(); first_frame=True
     pygame.init(); pygame.freetype.init()
     screen_width,screen_height=1280,720
     pygame.display.set_mode((screen_width,screen_height),DOUBLEBUF|OPENGL)
@@ -299,53 +653,57 @@ def main():
     hud_font = pygame.freetype.SysFont("Arial", 24)
     try: sign_font = pygame.freetype.SysFont("Consolas", 48)
     except: sign_font = pygame.freetype.SysFont("Courier New", 48)
-    SIGN_WIDTH, SIGN_HEIGHT = 256, 128; sign_surface = pygame.Surface((SIGN_WIDTH, SIGN_HEIGHT))
-    sign_texture = glGenTextures(1); glBindTexture(GL_TEXTURE_2D, sign_texture); glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST); glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, SIGN_WIDTH, SIGN_HEIGHT, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
     
-    hora_atual=12.0; tipo_painel_selecionado=610; num_rows,num_cols=2,3
+    tipo_painel_selecionado=610; num_rows,num_cols=2,3
     panel_tilt_angle=20.0; panel_azimuth_angle = 0.0
-    battery_capacity_kwh = 50.0; battery_current_kwh = 40.0; battery_max_charge_kw = 15.0
-    farm_power_load_kw = 2.0
-    
-    shaders={'depth':create_shader_program(VERTEX_SHADER_DEPTH,FRAGMENT_SHADER_DEPTH),'shadow':create_shader_program(VERTEX_SHADER_SHADOW,FRAGMENT_SHADER_SHADOW), 'sun': create_shader_program(VERTEX_SHADER_SUN, FRAGMENT_SHADER_SUN)}
-    textures={'grass':load_texture("grass.png"),'panel':load_texture("solar_cell.png"), 'metal':load_texture("metal_frame.png"), 'sign': sign_texture, 'red': load_texture("red.png"), 'green': load_texture("green.png")}
-    if -1 in textures.values():pygame.quit();sys.exit()
-
-    cube_vao, plane_vao, cylinder_vao, sphere_vao = setup_geometry()
-    vaos = {'cube': cube_vao, 'plane': plane_vao, 'cylinder': cylinder_vao, 'sphere': sphere_vao}
-    panel_positions=update_panel_positions(num_rows,num_cols)
+    simulador = BatterySimulator(capacity_kwh=50.0, current_kwh=40.0, max_charge_kw=15.0, load_kw=2.0, hour=12.0, load_profile_kw=load_model(load, 2.0) if load is not None else None)
+    solar=SolarFrame(sun, generation)
     
-    SHADOW_WIDTH,SHADOW_HEIGHT=2048,2048; depthMapFBO=glGenFramebuffers(1)
-    glBindFramebuffer(GL_FRAMEBUFFER,depthMapFBO); depthMap=glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D,depthMap); glTexImage2D(GL_TEXTURE_2D,0,GL_DEPTH_COMPONENT,SHADOW_WIDTH,SHADOW_HEIGHT,0,GL_DEPTH_COMPONENT,GL_FLOAT,None)
-    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_NEAREST);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_NEAREST)
-    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_S,GL_CLAMP_TO_BORDER);glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_T,GL_CLAMP_TO_BORDER)
-    borderColor=np.array([1.,1.,1.,1.],dtype=np.float32);glTexParameterfv(GL_TEXTURE_2D,GL_TEXTURE_BORDER_COLOR,borderColor)
-    glFramebufferTexture2D(GL_FRAMEBUFFER,GL_DEPTH_ATTACHMENT,GL_TEXTURE_2D,depthMap,0)
-    glDrawBuffer(GL_NONE);glReadBuffer(GL_NONE)
-    if glCheckFramebufferStatus(GL_FRAMEBUFFER)!=GL_FRAMEBUFFER_COMPLETE:print("ERRO FBO!");pygame.quit();sys.exit()
-    glBindFramebuffer(GL_FRAMEBUFFER,0)
+    texture_loader=TextureLoader(startup_time); renderer=FarmRenderer(sign_font, texture_loader)
+    panel_positions=update_panel_positions(num_rows,num_cols); panel_instances=renderer.panel_instances
     
-    camera=Camera(); clock=pygame.time.Clock()
-    glUseProgram(shaders['shadow']); glUniform1i(glGetUniformLocation(shaders['shadow'],"diffuseTexture"),0); glUniform1i(glGetUniformLocation(shaders['shadow'],"shadowMap"),1)
-    glEnable(GL_DEPTH_TEST)
+    camera=Camera(); clock=pygame.time.Clock(); hud=HudRenderer(hud_font)
+    profiler=FrameProfiler(); profile_lines=[]; profile_shown=0
+    # Passo fixo: o relógio simulado anda o mesmo tanto por quadro, então uma gravação não depende da velocidade da máquina
+    fixed_steps=int(round(args.minutos_por_quadro*60./simulador.step_seconds)) if args.minutos_por_quadro else 0
+    capture=FrameCapture(FrameWriter(args.gravar), screen_width, screen_height) if args.gravar else None
+    def close():
+        if profiler.timings.csv_path: print(f"Tempos por quadro gravados em {profiler.timings.stop_csv()}")
+        if capture: print(f"{capture.finish()} quadros gravados em {capture.writer.directory}")
+        pygame.quit()
     
     while True:
-        delta_time=clock.tick(60)/1000.0
+        delta_time=clock.tick(0 if fixed_steps else 60)/1000.0
+        if fixed_steps: delta_time=1/60.
+        profiler.stage('eventos')
+        texture_loader.poll()
+        # Gravando, nenhum quadro sai com as texturas ainda decodificando: a mesma linha de comando dá as mesmas imagens
+        if capture: texture_loader.wait()
         for event in pygame.event.get():
-            if event.type==pygame.QUIT or(event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE):pygame.quit();return
+            if event.type==pygame.QUIT or(event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE):
+                close();return
             if event.type==pygame.MOUSEMOTION: camera.process_mouse_movement(-event.rel[0], -event.rel[1])
             if event.type==pygame.KEYDOWN:
-                if event.key==pygame.K_UP:hora_atual=(hora_atual+0.5)%24.
-                if event.key==pygame.K_DOWN:hora_atual=(hora_atual-0.5+24.)%24.
+                if event.key==pygame.K_UP:simulador.hour=(simulador.hour+0.5)%24.
+                if event.key==pygame.K_DOWN:simulador.hour=(simulador.hour-0.5+24.)%24.
+                if event.key==pygame.K_PERIOD:simulador.change_speed(+1)
+                if event.key==pygame.K_COMMA:simulador.change_speed(-1)
+                if event.key==pygame.K_RIGHTBRACKET:simulador.day+=1
+                if event.key==pygame.K_LEFTBRACKET:simulador.day=max(0,simulador.day-1)
                 if event.key==pygame.K_1:tipo_painel_selecionado=160
                 if event.key==pygame.K_2:tipo_painel_selecionado=330
                 if event.key==pygame.K_3:tipo_painel_selecionado=610
-                if event.key==pygame.K_EQUALS or event.key==pygame.K_PLUS: num_cols=min(10,num_cols+1);panel_positions=update_panel_positions(num_rows,num_cols)
+                if event.key==pygame.K_EQUALS or event.key==pygame.K_PLUS: num_cols=min(MAX_COLS,num_cols+1);panel_positions=update_panel_positions(num_rows,num_cols)
                 if event.key==pygame.K_MINUS: num_cols=max(1,num_cols-1);panel_positions=update_panel_positions(num_rows,num_cols)
+                if event.key==pygame.K_PAGEUP: num_rows=min(MAX_ROWS,num_rows+1);panel_positions=update_panel_positions(num_rows,num_cols)
+                if event.key==pygame.K_PAGEDOWN: num_rows=max(1,num_rows-1);panel_positions=update_panel_positions(num_rows,num_cols)
                 if event.key == pygame.K_q: panel_azimuth_angle = (panel_azimuth_angle - 5.0) % 360
                 if event.key == pygame.K_e: panel_azimuth_angle = (panel_azimuth_angle + 5.0) % 360
+                if event.key == pygame.K_F3: profiler.visible = not profiler.visible
+                if event.key == pygame.K_F4: profiler.toggle_csv()
+                if event.key == pygame.K_F5:
+                    if capture: print(f"{capture.finish()} quadros gravados em {capture.writer.directory}"); capture=None
+                    else: directory=time.strftime("gravacao_%Y%m%d_%H%M%S"); capture=FrameCapture(FrameWriter(directory), screen_width, screen_height); print(f"Gravando quadros em {directory}/")
 
         keys=pygame.key.get_pressed()
         if keys[pygame.K_w]:camera.process_keyboard("FORWARD",delta_time)
@@ -353,73 +711,55 @@ def main():
         if keys[pygame.K_a]:camera.process_keyboard("LEFT",delta_time)
         if keys[pygame.K_d]:camera.process_keyboard("RIGHT",delta_time)
 
-        sun_max_height = 30.0
-        lightPos=calculate_sun_position(hora_atual, height=sun_max_height)
-        specs_do_painel = PAINEL_SPECS[tipo_painel_selecionado]
-        irradiance_factor = max(0, lightPos[1] / sun_max_height)
-        tilt_rad=np.radians(panel_tilt_angle); initial_normal = np.array([0, np.cos(tilt_rad), np.sin(tilt_rad)])
-        azimuth_rad = np.radians(panel_azimuth_angle); c, s = np.cos(azimuth_rad), np.sin(azimuth_rad)
-        azimuth_rot_mat = np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
-        panel_normal = azimuth_rot_mat @ initial_normal
-        light_dir=lightPos-np.array([0,2,0]);light_dir=light_dir/np.linalg.norm(light_dir)
-        angular_efficiency=max(0,np.dot(panel_normal,light_dir))
-        total_efficiency = angular_efficiency * irradiance_factor
-        total_power_kw = (len(panel_positions)*specs_do_painel['wattage']*total_efficiency) / 1000.0
+        profiler.stage('geracao')
+        hora_atual=simulador.hour; specs_do_painel = PAINEL_SPECS[tipo_painel_selecionado]
+        frame=solar.update(simulador.absolute_hour,num_rows,num_cols,panel_positions,tipo_painel_selecionado,panel_tilt_angle,panel_azimuth_angle)
+        lightPos,shadow_key,shading,total_power_kw=frame.light_pos,frame.shadow_key,frame.shading,frame.power_kw
         
-        net_power_kw = total_power_kw - farm_power_load_kw
-        if net_power_kw > 0:
-            charge_power_kw = min(net_power_kw, battery_max_charge_kw)
-            energy_change_kwh = charge_power_kw * (delta_time / 3600.0)
-            battery_current_kwh += energy_change_kwh; battery_status = "CARREGANDO"
-        else:
-            energy_change_kwh = abs(net_power_kw) * (delta_time / 3600.0)
-            battery_current_kwh -= energy_change_kwh; battery_status = "DESCARREGANDO"
-        if battery_current_kwh <= 0:
-            battery_current_kwh = 0
-            if net_power_kw < 0: battery_status = "SEM ENERGIA" 
-        if battery_current_kwh >= battery_capacity_kwh:
-            battery_current_kwh = battery_capacity_kwh
-            if net_power_kw > 0: battery_status = "CARGA MÁXIMA"
+        # A bateria anda em passo fixo no relógio simulado; o sombreamento do quadro vale para todos os passos dele
+        if fixed_steps: simulador.step(fixed_steps, frame.generation_kw)
+        else: simulador.advance(delta_time, frame.generation_kw)
+        battery_status = simulador.status; battery_current_kwh = simulador.current_kwh
         
-        battery_percentage = (battery_current_kwh / battery_capacity_kwh) * 100
-        update_sign_texture(sign_surface, sign_font, textures['sign'], total_power_kw)
-
-        projection=perspective(45.0,screen_width/screen_height,0.1,100.0); view=camera.get_view_matrix()
-        lightProjection=ortho(-40.0,40.0,-40.0,40.0,1.0,80.0); lightView=camera._look_at(lightPos,np.array([0.,0.,0.]),np.array([0.,1.,0.]))
-        lightSpaceMatrix=lightView@lightProjection
-        glUseProgram(shaders['depth']);glUniformMatrix4fv(glGetUniformLocation(shaders['depth'],"lightSpaceMatrix"),1,GL_FALSE,lightSpaceMatrix)
-        glViewport(0,0,SHADOW_WIDTH,SHADOW_HEIGHT);glBindFramebuffer(GL_FRAMEBUFFER,depthMapFBO);glClear(GL_DEPTH_BUFFER_BIT)
-        draw_scene(shaders['depth'],vaos,textures,panel_positions,specs_do_painel,panel_tilt_angle, panel_azimuth_angle, battery_percentage)
-        glBindFramebuffer(GL_FRAMEBUFFER,0)
-
-        glViewport(0,0,screen_width,screen_height); glClearColor(0.5,0.8,1.0,1.0); glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
-        glUseProgram(shaders['shadow'])
-        glUniformMatrix4fv(glGetUniformLocation(shaders['shadow'],"projection"),1,GL_FALSE,projection); glUniformMatrix4fv(glGetUniformLocation(shaders['shadow'],"view"),1,GL_FALSE,view)
-        glUniform3fv(glGetUniformLocation(shaders['shadow'],"viewPos"),1,camera.position); glUniform3fv(glGetUniformLocation(shaders['shadow'],"lightPos"),1,lightPos)
-        glUniformMatrix4fv(glGetUniformLocation(shaders['shadow'],"lightSpaceMatrix"),1,GL_FALSE,lightSpaceMatrix)
-        glActiveTexture(GL_TEXTURE1);glBindTexture(GL_TEXTURE_2D,depthMap)
-        draw_scene(shaders['shadow'],vaos,textures,panel_positions,specs_do_painel,panel_tilt_angle, panel_azimuth_angle, battery_percentage)
-
-        glDepthMask(GL_FALSE)
-        glUseProgram(shaders['sun'])
-        glUniformMatrix4fv(glGetUniformLocation(shaders['sun'], "projection"), 1, GL_FALSE, projection)
-        glUniformMatrix4fv(glGetUniformLocation(shaders['sun'], "view"), 1, GL_FALSE, view)
-        trans_mat = np.identity(4, dtype=np.float32); trans_mat[3, 0:3] = lightPos
-        scale_mat = np.diag([2.0, 2.0, 2.0, 1.0]).astype(np.float32)
-        model_sun = scale_mat @ trans_mat
-        glUniformMatrix4fv(glGetUniformLocation(shaders['sun'], "model"), 1, GL_FALSE, model_sun)
-        glBindVertexArray(vaos['sphere'])
-        glDrawArrays(GL_TRIANGLES, 0, len(SPHERE_VERTICES)//8)
-        glDepthMask(GL_TRUE)
+        battery_percentage = simulador.percentage
+        panel_instances.update(panel_positions, specs_do_painel, panel_tilt_angle, panel_azimuth_angle)
+        profiler.stage('placa')
+        renderer.sign.update(total_power_kw)
+        profiler.stage('geracao')
+        renderer.draw(camera, lightPos, shadow_key, battery_percentage, (screen_width, screen_height), stage=profiler.stage)
 
+        profiler.stage('texto')
         minutos=int((hora_atual%1)*60)
-        pygame.display.set_caption(f"Fazenda | Hora: {int(hora_atual):02d}:{minutos:02d} | Painel: {tipo_painel_selecionado}W | Azimute: {panel_azimuth_angle:.1f}°")
-        render_text(f"Geração Placas: {total_power_kw:.2f} kW",hud_font,(10,screen_height-30),screen_width,screen_height)
-        render_text(f"Consumo Fazenda: {farm_power_load_kw:.2f} kW",hud_font,(10,screen_height-60),screen_width,screen_height)
-        render_text(f"Bateria: {battery_current_kwh:.2f}/{battery_capacity_kwh:.1f} kWh ({battery_percentage:.1f}%)", hud_font, (10, screen_height - 90), screen_width, screen_height)
-        render_text(f"Status: {battery_status}", hud_font, (10, screen_height - 120), screen_width, screen_height)
+        pygame.display.set_caption(f"Fazenda | Dia {simulador.day+1} | Hora: {int(hora_atual):02d}:{minutos:02d} ({simulador.speed}x) | Painel: {tipo_painel_selecionado}W | Azimute: {panel_azimuth_angle:.1f}° | GL: {GL_CALLS.last_frame} chamadas, {GL_CALLS.last_frame_draws} desenhos/quadro{' | Gravando' if capture else ''}")
+        hud.text.set_line('geracao', f"Geração Placas: {total_power_kw:.2f} kW", (10, screen_height - 30))
+        hud.text.set_line('consumo', f"Consumo Fazenda: {simulador.current_load_kw:.2f} kW", (10, screen_height - 60))
+        hud.text.set_line('bateria', f"Bateria: {battery_current_kwh:.2f}/{simulador.capacity_kwh:.1f} kWh ({battery_percentage:.1f}%)", (10, screen_height - 90))
+        hud.text.set_line('status', f"Status: {battery_status}", (10, screen_height - 120))
+        hud.text.set_line('sombreamento', f"Sombreamento: {100*shading.mean():.1f}% ({np.count_nonzero(shading)} painéis afetados)", (10, screen_height - 150))
+        visible=panel_instances.passes['camera']
+        hud.text.set_line('visiveis', f"Visíveis: {visible.count}/{panel_instances.total} painéis ({panel_instances.total-visible.count} descartados, {visible.visible_cells}/{panel_instances.total_cells} células, {visible.post_lod_count} com LOD)", (10, screen_height - 180))
+        if weather is not None:
+            hours = np.array([simulador.absolute_hour]); clima = f"Clima: {str(weather.timestamp(hours[0])).replace('T', ' ')}"
+            if 'ghi' in weather.columns: clima += f" | GHI {weather.sample('ghi', hours, 0.)[0]:.0f} W/m²"
+            if 'temp_air' in weather.columns: clima += f" | {weather.sample('temp_air', hours)[0]:.1f} °C"
+            hud.text.set_line('clima', clima, (10, screen_height - 210))
+        if sun is not None:
+            elevacao, azimute = sun.elevation_azimuth(frame.sun_hour)
+            hud.text.set_line('sol', f"Sol: elevação {elevacao:.1f}°, azimute {azimute:.1f}° (lat {sun.latitude:.2f}, lon {sun.longitude:.2f}, UTC{sun.utc_offset:+g})", (10, screen_height - 240))
+        # As estatísticas da janela do perfil só são refeitas a cada 15 quadros
+        if not profiler.visible: profile_lines = []
+        elif profiler.frame % 15 == 0 or not profile_lines: profile_lines = profiler.overlay_lines()
+        for i, line in enumerate(profile_lines): hud.text.set_line(('perfil', i), line, (10, 10 + 26 * i))
+        for i in range(len(profile_lines), profile_shown): hud.text.remove_line(('perfil', i))
+        profile_shown = len(profile_lines)
+        hud.draw(screen_width, screen_height)
 
-        pygame.display.flip()
+        profiler.stage('flip')
+        # A leitura tem que ser agendada antes do flip, enquanto o buffer de trás ainda tem o quadro
+        if capture: capture.capture()
+        pygame.display.flip(); GL_CALLS.end_frame(); profiler.end_frame()
+        if first_frame: print(f"Primeiro quadro em {time.perf_counter()-startup_time:.2f} s"); first_frame=False
+        if args.horas is not None and simulador.elapsed_hours >= args.horas: close();return
 
 if __name__ == '__main__':
     main()
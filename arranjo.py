@@ -0,0 +1,119 @@
+"""Layout do arranjo de painéis e sombreamento entre fileiras, sem pygame nem OpenGL.
+
+As matrizes de modelo daqui são as mesmas enviadas ao VBO de instâncias do simulador, então o
+teste de sombreamento usa exatamente a geometria que aparece na tela.
+"""
+import numpy as np
+
+POST_HEIGHT = 2.
+
+def update_panel_positions(rows, cols):
+    spacing_x, spacing_z = 4.0, 5.0
+    i, j = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+    positions = np.zeros((rows * cols, 3))
+    positions[:, 0] = ((j - (cols - 1) / 2.0) * spacing_x).ravel(); positions[:, 2] = ((i - (rows - 1) / 2.0) * spacing_z - 10.0).ravel()
+    return positions
+
+def post_model_matrices(panel_positions, post_height=POST_HEIGHT):
+    # Escala @ translação local @ translação da base, para todas as posições de uma vez
+    sup_trans = np.identity(4, dtype=np.float32); sup_trans[3, 1] = post_height / 2.
+    sup_scale = np.diag([.15, post_height, .15, 1.]).astype(np.float32)
+    base_trans = np.tile(np.identity(4, dtype=np.float32), (len(panel_positions), 1, 1)); base_trans[:, 3, 0:3] = panel_positions
+    return np.ascontiguousarray((sup_scale @ sup_trans) @ base_trans, dtype=np.float32)
+
+def panel_model_matrices(panel_positions, panel_size, panel_tilt, panel_azimuth, post_height=POST_HEIGHT):
+    panel_trans = np.identity(4, dtype=np.float32); panel_trans[3, 1] = post_height
+    tilt_rad = np.radians(panel_tilt); c_tilt, s_tilt = np.cos(tilt_rad), np.sin(tilt_rad)
+    tilt_rot = np.array([[1, 0, 0, 0], [0, c_tilt, -s_tilt, 0], [0, s_tilt, c_tilt, 0], [0, 0, 0, 1]], dtype=np.float32)
+    azimuth_rad = np.radians(panel_azimuth); c_az, s_az = np.cos(azimuth_rad), np.sin(azimuth_rad)
+    azimuth_rot = np.array([[c_az, 0, s_az, 0], [0, 1, 0, 0], [-s_az, 0, c_az, 0], [0, 0, 0, 1]], dtype=np.float32)
+    panel_scale = np.diag(list(panel_size) + [1.]).astype(np.float32)
+    base_trans = np.tile(np.identity(4, dtype=np.float32), (len(panel_positions), 1, 1)); base_trans[:, 3, 0:3] = panel_positions
+    return np.ascontiguousarray((panel_scale @ tilt_rot @ azimuth_rot @ panel_trans) @ base_trans, dtype=np.float32)
+
+class PanelGrid:
+    """Índice uniforme (células quadradas no plano xz) das posições dos painéis, guardado em formato CSR."""
+    def __init__(self, panel_positions, cell_size):
+        self.cell_size = cell_size
+        cells = np.floor(panel_positions[:, [0, 2]] / cell_size).astype(np.int64)
+        self.origin = cells.min(axis=0); self.dims = cells.max(axis=0) - self.origin + 1
+        ids = self.cell_ids(cells)
+        self.order = np.argsort(ids, kind='stable')
+        self.start = np.searchsorted(ids[self.order], np.arange(self.dims.prod() + 1))
+        self.max_per_cell = int(np.diff(self.start).max())
+    def cell_ids(self, cells):
+        rel = cells - self.origin; inside = np.all((rel >= 0) & (rel < self.dims), axis=-1)
+        return np.where(inside, rel[..., 0] + rel[..., 1] * self.dims[0], -1)
+    def gather(self, cell_ids):
+        """Painéis das células (..., K) -> (..., K * max_per_cell), com -1 nas posições vazias."""
+        safe = np.maximum(cell_ids, 0); first = self.start[safe]
+        count = np.where(cell_ids >= 0, self.start[safe + 1] - first, 0)
+        slot = np.arange(self.max_per_cell); index = np.minimum(first[..., None] + slot, len(self.order) - 1)
+        panels = np.where(slot < count[..., None], self.order[index], -1)
+        return panels.reshape(cell_ids.shape[:-1] + (-1,))
+    def occupied_cells(self, panel_positions):
+        """Células não vazias: início de cada uma em self.order e o mínimo/máximo xz das posições dela."""
+        cells = np.flatnonzero(np.diff(self.start)); first = self.start[cells]
+        xz = panel_positions[self.order][:, [0, 2]]
+        return first, np.minimum.reduceat(xz, first), np.maximum.reduceat(xz, first)
+    def corridor(self, panel_positions, direction_xz, reach, max_steps=64):
+        """Candidatos a ocluir cada painel: painéis nas células do corredor que sai dele na direção do sol
+        por `reach` metros, com uma célula de folga para os lados."""
+        step = self.cell_size / 2.; reach = min(reach, max_steps * step)
+        distances = np.arange(-step, reach + 2 * step, step)
+        points = panel_positions[:, None, [0, 2]] + distances[None, :, None] * direction_xz
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        neighbours = np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1], indexing='ij'), axis=-1).reshape(-1, 2)
+        ids = self.cell_ids(cells[:, :, None, :] + neighbours).reshape(len(panel_positions), -1)
+        # Remove células repetidas em cada linha e compacta as válidas à esquerda
+        ids = np.sort(ids, axis=1); ids[:, 1:][ids[:, 1:] == ids[:, :-1]] = -1
+        ids = -np.sort(-ids, axis=1); ids = ids[:, :max(1, int((ids >= 0).sum(axis=1).max()))]
+        return self.gather(ids)
+
+def shaded_fractions(panel_positions, panel_size, panel_tilt, panel_azimuth, light_dir, samples=3, grid=None):
+    """Fração sombreada de cada painel pela luz paralela `light_dir` (apontando para o sol).
+
+    Cada painel é tratado como o retângulo da sua face, amostrado em samples x samples pontos; um ponto
+    está na sombra se o raio até o sol cruza o retângulo de outro painel. Como todos os painéis têm a mesma
+    orientação, a distância até o plano do ocluidor só depende do par, e o teste inteiro vira aritmética
+    vetorizada sobre (painéis, candidatos, amostras). Os candidatos vêm de um PanelGrid.
+    """
+    panel_positions = np.asarray(panel_positions, dtype=np.float64); n = len(panel_positions)
+    light_dir = np.asarray(light_dir, dtype=np.float64); light_dir = light_dir / np.linalg.norm(light_dir)
+    if n < 2: return np.zeros(n)
+    model = panel_model_matrices(np.zeros((1, 3)), panel_size, panel_tilt, panel_azimuth)[0].astype(np.float64)
+    axis_u, axis_n, axis_w = model[:3, :3] / np.asarray(panel_size, dtype=np.float64)[:, None]
+    half_u, half_w = panel_size[0] / 2., panel_size[2] / 2.
+    light_u, light_n, light_w = light_dir @ axis_u, light_dir @ axis_n, light_dir @ axis_w
+    if abs(light_n) < 1e-9: return np.zeros(n)
+    # Um raio só pode atingir outro painel dentro da faixa de altura ocupada pelos painéis
+    half_height = abs(axis_u[1]) * half_u + abs(axis_w[1]) * half_w
+    horizontal = np.hypot(light_dir[0], light_dir[2]); radius = np.hypot(half_u, half_w)
+    if grid is None: grid = PanelGrid(panel_positions, 2. * radius)
+    direction_xz = light_dir[[0, 2]] / horizontal if horizontal > 1e-9 else np.zeros(2)
+    reach = 2. * half_height * horizontal / abs(light_dir[1]) if abs(light_dir[1]) > 1e-9 else np.inf
+    candidates = grid.corridor(panel_positions, direction_xz, reach)
+    valid = (candidates >= 0) & (candidates != np.arange(n)[:, None]); candidates = np.maximum(candidates, 0)
+    centers = panel_positions + model[3, :3]
+    cu, cn, cw = centers @ axis_u, centers @ axis_n, centers @ axis_w
+    du = cu[candidates] - cu[:, None]; dw = cw[candidates] - cw[:, None]
+    t = (cn[candidates] - cn[:, None]) / light_n
+    valid &= t > 1e-6
+    offsets = ((np.arange(samples) + 0.5) / samples) * 2. - 1.
+    a, b = [g.ravel() for g in np.meshgrid(offsets, offsets, indexing='ij')]
+    hit_u = np.abs(a * half_u + (t * light_u - du)[..., None]) <= half_u
+    hit_w = np.abs(b * half_w + (t * light_w - dw)[..., None]) <= half_w
+    shaded = np.any(hit_u & hit_w & valid[..., None], axis=1)
+    return shaded.mean(axis=1)
+
+def frustum_planes(clip_matrix):
+    """Os 6 planos (a, b, c, d), normais para dentro, do volume de uma matriz view @ projection na convenção
+    de vetor-linha do simulador (clip = [x, y, z, 1] @ matriz)."""
+    m = np.asarray(clip_matrix, dtype=np.float64); w = m[:, 3]
+    return np.array([w + m[:, 0], w - m[:, 0], w + m[:, 1], w - m[:, 1], w + m[:, 2], w - m[:, 2]])
+
+def boxes_in_frustum(planes, box_min, box_max):
+    """Caixas alinhadas (B, 3) que não estão inteiramente fora de algum plano (teste do vértice positivo)."""
+    normals = planes[:, :3]
+    positive = np.where(normals >= 0, box_max[:, None, :], box_min[:, None, :])
+    return np.all((positive * normals).sum(axis=-1) + planes[:, 3] >= 0, axis=1)
@@ -0,0 +1,219 @@
+"""Benchmark sem janela: cenários de desenho num contexto OpenGL fora da tela e micro-benchmarks das partes em Python.
+
+O contexto vem do EGL (sem superfície, funciona com o Mesa llvmpipe numa máquina sem GPU) ou do OSMesa, e a cena
+é desenhada por Fotovoltaico.FarmRenderer num framebuffer próprio, com os mesmos passes da janela. Cada cenário
+segue um roteiro de quadros (tamanho da fazenda, varredura do sol, giro do azimute, troca de painel) e registra a
+distribuição do tempo de quadro e as chamadas de GL e de desenho por quadro. Os resultados podem ser gravados como
+linha de base e comparados com ela nas execuções seguintes; a saída tem código 1 se alguma medida piorar além
+da tolerância.
+
+Exemplo:
+    python desempenho.py --gravar-linha-base
+    python desempenho.py --cenarios fazenda_10000,varredura_sol --tolerancia 10
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+
+PANEL_TILT = 20.0
+# Roteiros: cada cenário devolve, para n quadros, uma lista de (fileiras, colunas, hora, azimute, painel)
+SCENARIOS = {
+    'fazenda_6': lambda n: [(2, 3, 10., 0., 610)] * n,
+    'fazenda_100': lambda n: [(10, 10, 10., 0., 610)] * n,
+    'fazenda_1000': lambda n: [(25, 40, 10., 0., 610)] * n,
+    'fazenda_10000': lambda n: [(100, 100, 10., 0., 610)] * n,
+    'varredura_sol': lambda n: [(25, 40, 6. + 12. * k / n, 0., 610) for k in range(n)],
+    'rotacao_azimute': lambda n: [(25, 40, 10., 360. * k / n, 610) for k in range(n)],
+    'troca_painel': lambda n: [(25, 40, 10., 0., (160, 330, 610)[k % 3]) for k in range(n)],
+}
+FRAME_COLUMNS = ('quadro', 'geracao', 'placa', 'profundidade', 'sombras', 'sol', 'gpu', 'chamadas_gl', 'desenhos')
+
+def create_offscreen_context(platform_name, width, height):
+    """Cria e ativa um contexto OpenGL 3.3 de compatibilidade sem janela. PYOPENGL_PLATFORM precisa valer
+    `platform_name` antes do primeiro import do OpenGL. Devolve o que precisa continuar vivo enquanto o contexto é usado."""
+    if platform_name == 'egl':
+        import ctypes
+        from OpenGL import EGL
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY); major, minor = EGL.EGLint(), EGL.EGLint()
+        EGL.eglInitialize(display, major, minor)
+        config_attribs = (EGL.EGLint * 7)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_NONE)
+        config = EGL.EGLConfig(); n_configs = EGL.EGLint()
+        if not EGL.eglChooseConfig(display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(n_configs)) or n_configs.value < 1: raise RuntimeError("nenhuma configuração EGL com OpenGL")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context_attribs = (EGL.EGLint * 7)(EGL.EGL_CONTEXT_MAJOR_VERSION, 3, EGL.EGL_CONTEXT_MINOR_VERSION, 3, EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_COMPATIBILITY_PROFILE_BIT, EGL.EGL_NONE)
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, context_attribs)
+        # Sem superfície: a cena vai para o framebuffer criado por create_offscreen_framebuffer
+        if not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context): raise RuntimeError("eglMakeCurrent falhou")
+        return display, context
+    if platform_name == 'osmesa':
+        from OpenGL import osmesa, arrays
+        from OpenGL.GL import GL_RGBA, GL_UNSIGNED_BYTE
+        attribs = arrays.GLintArray.asArray([osmesa.OSMESA_FORMAT, GL_RGBA, osmesa.OSMESA_DEPTH_BITS, 24, osmesa.OSMESA_PROFILE, osmesa.OSMESA_COMPAT_PROFILE,
+                                             osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3, osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3, 0])
+        context = osmesa.OSMesaCreateContextAttribs(attribs, None)
+        if not context: raise RuntimeError("OSMesaCreateContextAttribs falhou")
+        buffer = arrays.GLubyteArray.zeros((height, width, 4))
+        if not osmesa.OSMesaMakeCurrent(context, buffer, GL_UNSIGNED_BYTE, width, height): raise RuntimeError("OSMesaMakeCurrent falhou")
+        return context, buffer
+    raise ValueError(f"plataforma desconhecida: {platform_name}")
+
+def create_offscreen_framebuffer(width, height):
+    from OpenGL.GL import (glGenFramebuffers, glBindFramebuffer, glGenRenderbuffers, glBindRenderbuffer, glRenderbufferStorage, glFramebufferRenderbuffer,
+                           glCheckFramebufferStatus, GL_FRAMEBUFFER, GL_RENDERBUFFER, GL_RGBA8, GL_DEPTH_COMPONENT24, GL_COLOR_ATTACHMENT0, GL_DEPTH_ATTACHMENT, GL_FRAMEBUFFER_COMPLETE)
+    fbo = glGenFramebuffers(1); glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+    for internal_format, attachment in ((GL_RGBA8, GL_COLOR_ATTACHMENT0), (GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)):
+        rbo = glGenRenderbuffers(1); glBindRenderbuffer(GL_RENDERBUFFER, rbo); glRenderbufferStorage(GL_RENDERBUFFER, internal_format, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, rbo)
+    if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE: raise RuntimeError("framebuffer fora da tela incompleto")
+    return fbo
+
+def load_sign_font():
+    import pygame.freetype
+    pygame.freetype.init()
+    try: return pygame.freetype.SysFont("Consolas", 48)
+    except Exception: return pygame.freetype.SysFont("Courier New", 48)
+
+def frame_statistics(timings, n_frames):
+    """Distribuição do tempo de quadro, médias das etapas e das contagens de chamadas de um cenário."""
+    samples = timings.samples[:n_frames]; frame_ms = samples[:, timings.index['quadro']]
+    p50, p95, p99 = np.percentile(frame_ms, [50, 95, 99]); means = np.nanmean(samples, axis=0)
+    return {'quadros': n_frames, 'media_ms': round(float(frame_ms.mean()), 4), 'p50_ms': round(float(p50), 4), 'p95_ms': round(float(p95), 4),
+            'p99_ms': round(float(p99), 4), 'max_ms': round(float(frame_ms.max()), 4),
+            'chamadas_gl': round(float(means[timings.index['chamadas_gl']]), 2), 'desenhos': round(float(means[timings.index['desenhos']]), 2),
+            'etapas_ms': {name: round(float(means[timings.index[name]]), 4) for name in FRAME_COLUMNS[1:7]}}
+
+def run_scenario(renderer, frames, viewport, framebuffer, warmup):
+    """Roda os quadros do roteiro com a mesma lógica por quadro do laço principal; os `warmup` primeiros não entram na conta."""
+    from OpenGL.GL import glFinish
+    import Fotovoltaico as app
+    from perfil import StageTimer, FrameTimings
+    camera = app.Camera(position=np.array([0.0, 2.5, 8.0])); timer = StageTimer(); renderer.reset_caches()
+    timings = FrameTimings(FRAME_COLUMNS, window=len(frames)); layout = None; solar = app.SolarFrame()
+    for k, (rows, cols, hour, azimuth, wattage) in enumerate([frames[0]] * warmup + frames):
+        timer.stage('geracao')
+        if layout != (rows, cols): panel_positions = app.update_panel_positions(rows, cols); layout = (rows, cols)
+        frame = solar.update(hour, rows, cols, panel_positions, wattage, PANEL_TILT, azimuth)
+        renderer.panel_instances.update(panel_positions, app.PAINEL_SPECS[wattage], PANEL_TILT, azimuth)
+        timer.stage('placa'); renderer.sign.update(frame.power_kw)
+        timer.stage('geracao'); renderer.draw(camera, frame.light_pos, frame.shadow_key, 80., viewport, framebuffer=framebuffer, stage=timer.stage)
+        # Espera a GPU terminar: o tempo de quadro inclui a rasterização, como o flip da janela
+        timer.stage('gpu'); glFinish()
+        values = timer.end_frame(); app.GL_CALLS.end_frame()
+        values['chamadas_gl'] = app.GL_CALLS.last_frame; values['desenhos'] = app.GL_CALLS.last_frame_draws
+        if k >= warmup: timings.record(k - warmup, values)
+    return frame_statistics(timings, len(frames))
+
+def time_call(fn, repeat):
+    """Tempos (ms) de `repeat` chamadas de fn, depois de uma chamada de aquecimento."""
+    fn(); times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter(); fn(); times[i] = (time.perf_counter() - start) * 1000.
+    return {'repeticoes': repeat, 'mediana_ms': round(float(np.median(times)), 4), 'min_ms': round(float(times.min()), 4), 'p95_ms': round(float(np.percentile(times, 95)), 4)}
+
+def micro_benchmarks(repeat):
+    """Partes em Python/NumPy do quadro e da partida, sem contexto OpenGL."""
+    from geracao import PAINEL_SPECS, PANEL_REFERENCE_POINT, calculate_sun_position, power_series_kw, energy_yield_kwh
+    from arranjo import update_panel_positions, shaded_fractions
+    from malhas import generate_cylinder_mesh, generate_sphere_mesh
+    from Fotovoltaico import render_sign_bitmap
+    font = load_sign_font(); positions = update_panel_positions(100, 100); day = np.arange(1440) / 60.
+    light_dir = calculate_sun_position(10., height=30.) - PANEL_REFERENCE_POINT; size = PAINEL_SPECS[610]['size']
+    counter = iter(range(10 ** 9))
+    benchmarks = {
+        'update_panel_positions_10000': lambda: update_panel_positions(100, 100),
+        'power_series_kw_dia_minuto': lambda: power_series_kw(day, 20., 0., 610, 6),
+        'energy_yield_kwh_8760h_x_24': lambda: energy_yield_kwh(np.arange(0., 60., 10.)[:, None], np.arange(0., 360., 90.), 610, 6),
+        'shaded_fractions_10000': lambda: shaded_fractions(positions, size, 20., 0., light_dir),
+        # Um texto diferente a cada chamada, como a placa sem o cache de bitmaps
+        'render_sign_bitmap': lambda: render_sign_bitmap(font, 256, 128, f"{next(counter) % 10000 / 100:.2f} kW"),
+        'generate_cylinder_mesh': generate_cylinder_mesh,
+        'generate_sphere_mesh': generate_sphere_mesh,
+    }
+    return {name: time_call(fn, repeat) for name, fn in benchmarks.items()}
+
+# Medidas comparadas com a linha de base: tempos (piora = aumento percentual) e contagens (piora = aumento absoluto)
+COMPARED_TIMES = {'cenarios': ('media_ms', 'p95_ms'), 'micro': ('mediana_ms',)}
+COMPARED_COUNTS = ('chamadas_gl', 'desenhos')
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Linhas do relatório de comparação e se alguma medida piorou além de `tolerance` % (tempos) ou aumentou (contagens)."""
+    lines = []; regressed = False
+    for group, metrics in COMPARED_TIMES.items():
+        for name, current in results.get(group, {}).items():
+            reference = baseline.get(group, {}).get(name)
+            if reference is None: lines.append(f"  {name}: sem linha de base"); continue
+            parts = []
+            for metric in metrics:
+                change = 100. * (current[metric] / reference[metric] - 1.) if reference[metric] > 0 else 0.
+                flag = " PIOROU" if change > tolerance else ""; regressed |= bool(flag)
+                parts.append(f"{metric} {reference[metric]:.3f} -> {current[metric]:.3f} ({change:+.1f}%){flag}")
+            for metric in COMPARED_COUNTS:
+                if metric in current and metric in reference and current[metric] != reference[metric]:
+                    flag = " PIOROU" if current[metric] > reference[metric] else ""; regressed |= bool(flag)
+                    parts.append(f"{metric} {reference[metric]:g} -> {current[metric]:g}{flag}")
+            lines.append(f"  {name}: " + ", ".join(parts))
+    return lines, regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sem janela do simulador da fazenda solar")
+    parser.add_argument('--plataforma', choices=('egl', 'osmesa'), default='egl', help="contexto OpenGL fora da tela")
+    parser.add_argument('--largura', type=int, default=1280); parser.add_argument('--altura', type=int, default=720)
+    parser.add_argument('--cenarios', default=','.join(SCENARIOS), help="cenários separados por vírgula")
+    parser.add_argument('--quadros', type=int, default=120, help="quadros medidos por cenário")
+    parser.add_argument('--aquecimento', type=int, default=10, help="quadros descartados no início de cada cenário")
+    parser.add_argument('--repeticoes', type=int, default=20, help="repetições de cada micro-benchmark")
+    parser.add_argument('--sem-render', action='store_true', help="só os micro-benchmarks")
+    parser.add_argument('--sem-micro', action='store_true', help="só os cenários de desenho")
+    parser.add_argument('--linha-base', default='desempenho_base.json', help="arquivo JSON da linha de base")
+    parser.add_argument('--gravar-linha-base', action='store_true', help="grava os resultados como nova linha de base")
+    parser.add_argument('--tolerancia', type=float, default=15., help="piora percentual aceita nos tempos")
+    parser.add_argument('--saida', help="grava também os resultados desta execução neste JSON")
+    args = parser.parse_args(argv)
+    scenarios = [name for name in args.cenarios.split(',') if name]
+    for name in scenarios:
+        if name not in SCENARIOS: parser.error(f"cenário {name} não existe ({', '.join(SCENARIOS)})")
+    # O PyOpenGL escolhe a plataforma no primeiro import; o EGL do Mesa sem X precisa da plataforma surfaceless
+    os.environ['PYOPENGL_PLATFORM'] = args.plataforma
+    if args.plataforma == 'egl': os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+    results = {'sistema': {'python': platform.python_version(), 'maquina': platform.machine(), 'data': time.strftime('%Y-%m-%d %H:%M:%S')}, 'cenarios': {}, 'micro': {}}
+
+    if not args.sem_render:
+        try: context = create_offscreen_context(args.plataforma, args.largura, args.altura)
+        except Exception as e: print(f"ERRO: não foi possível criar o contexto {args.plataforma}: {e}"); return 1
+        from OpenGL.GL import glGetString, GL_RENDERER, GL_VERSION
+        import Fotovoltaico as app
+        results['sistema'].update({'renderer': glGetString(GL_RENDERER).decode(), 'gl': glGetString(GL_VERSION).decode(), 'resolucao': f'{args.largura}x{args.altura}'})
+        print(f"{results['sistema']['renderer']} | OpenGL {results['sistema']['gl']} | {args.largura}x{args.altura}")
+        texture_loader = app.TextureLoader(time.perf_counter()); renderer = app.FarmRenderer(load_sign_font(), texture_loader)
+        while texture_loader.pending: texture_loader.poll(); time.sleep(0.01)
+        framebuffer = create_offscreen_framebuffer(args.largura, args.altura)
+        print(f"{'cenário':<18}{'média':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'máx':>8}  chamadas GL  desenhos")
+        for name in scenarios:
+            stats = run_scenario(renderer, SCENARIOS[name](args.quadros), (args.largura, args.altura), framebuffer, args.aquecimento)
+            results['cenarios'][name] = stats
+            print(f"{name:<18}{stats['media_ms']:>8.2f}{stats['p50_ms']:>8.2f}{stats['p95_ms']:>8.2f}{stats['p99_ms']:>8.2f}{stats['max_ms']:>8.2f}  {stats['chamadas_gl']:>11.0f}  {stats['desenhos']:>8.0f}")
+
+    if not args.sem_micro:
+        results['micro'] = micro_benchmarks(args.repeticoes)
+        print(f"{'micro-benchmark':<32}{'mediana':>10}{'mín':>10}{'p95':>10}  (ms)")
+        for name, stats in results['micro'].items(): print(f"{name:<32}{stats['mediana_ms']:>10.3f}{stats['min_ms']:>10.3f}{stats['p95_ms']:>10.3f}")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f: json.dump(results, f, indent=2, ensure_ascii=False)
+    regressed = False
+    if args.gravar_linha_base:
+        with open(args.linha_base, 'w', encoding='utf-8') as f: json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Linha de base gravada em {args.linha_base}")
+    elif os.path.exists(args.linha_base):
+        with open(args.linha_base, encoding='utf-8') as f: baseline = json.load(f)
+        print(f"Comparação com {args.linha_base} ({baseline.get('sistema', {}).get('renderer', '?')}, {baseline.get('sistema', {}).get('data', '?')}), tolerância {args.tolerancia:.0f}%:")
+        lines, regressed = compare_with_baseline(results, baseline, args.tolerancia)
+        print("\n".join(lines))
+    return 1 if regressed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
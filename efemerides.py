@@ -0,0 +1,89 @@
+"""Posição real do sol (efemérides) e tabelas de consulta por local e ano, sem pygame nem OpenGL.
+
+solar_position implementa, vetorizado, o algoritmo da NOAA (Meeus simplificado, erro de alguns centésimos de
+grau): elevação e azimute do sol para latitude, longitude e instantes em UTC. Como o simulador e as varreduras
+consultam o sol a cada passo, SunTable calcula uma vez as direções de um ano inteiro numa grade de
+`step_minutes` e cada consulta vira uma busca na tabela com interpolação linear, sem trigonometria.
+
+Na cena o eixo x aponta para o norte, o y para cima e o z para o leste; numa fazenda no hemisfério sul o sol
+nasce em +z e passa pelo lado +x, como no modelo simplificado de geracao.calculate_sun_position.
+
+Exemplo:
+    >>> sol = efemerides.sun_table(-15.78, -47.93, 2001)       # Brasília, hora local (UTC-3)
+    >>> light_dir, irradiance = sol.light(np.array([12., 24. * 172 + 12.]))
+"""
+import functools
+import numpy as np
+from geracao import PANEL_REFERENCE_POINT
+
+# Distância da luz ao ponto de referência dos painéis (cabe no volume ortográfico do shadow map)
+SUN_DISTANCE = 32.0
+SUN_TABLE_STEP_MINUTES = 10.
+
+def solar_position(minutes_utc, latitude, longitude):
+    """Elevação e azimute (graus, azimute a partir do norte no sentido horário) para minutos UTC desde 1970."""
+    minutes_utc = np.asarray(minutes_utc, dtype=np.float64)
+    jc = (minutes_utc / 1440. + 2440587.5 - 2451545.) / 36525.
+    mean_long = np.radians((280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360.)
+    mean_anom = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    eccentricity = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    center = np.radians(np.sin(mean_anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc)) + np.sin(2 * mean_anom) * (0.019993 - 0.000101 * jc) + np.sin(3 * mean_anom) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = mean_long + center - np.radians(0.00569 + 0.00478 * np.sin(omega))
+    obliquity = np.radians(23. + (26. + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60.) / 60. + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_long))
+    # Equação do tempo (minutos): diferença entre o tempo solar verdadeiro e o médio
+    y = np.tan(obliquity / 2.) ** 2
+    equation_of_time = 4. * np.degrees(y * np.sin(2 * mean_long) - 2 * eccentricity * np.sin(mean_anom) + 4 * eccentricity * y * np.sin(mean_anom) * np.cos(2 * mean_long)
+                                       - 0.5 * y * y * np.sin(4 * mean_long) - 1.25 * eccentricity ** 2 * np.sin(2 * mean_anom))
+    true_solar_minutes = (minutes_utc % 1440. + equation_of_time + 4. * longitude) % 1440.
+    hour_angle = np.radians(true_solar_minutes / 4. - 180.); lat = np.radians(latitude)
+    elevation = np.arcsin(np.clip(np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle), -1., 1.))
+    azimuth = (np.degrees(np.arctan2(np.sin(hour_angle), np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))) + 180.) % 360.
+    return np.degrees(elevation), azimuth
+
+def sun_directions(elevation, azimuth):
+    """Vetor unitário da cena (shape + (3,)) apontando para o sol: x = norte, y = cima, z = leste."""
+    elevation = np.radians(elevation); azimuth = np.radians(azimuth)
+    return np.stack([np.cos(elevation) * np.cos(azimuth), np.sin(elevation), np.cos(elevation) * np.sin(azimuth)], axis=-1)
+
+class SunTable:
+    """Direções do sol de um ano inteiro num local, de `step_minutes` em `step_minutes` na hora local padrão
+    (UTC + utc_offset). As consultas usam as horas absolutas do simulador (dia * 24 + hora), com o dia 0 em
+    `start_day` dias após 1º de janeiro, e dão a volta no fim do ano."""
+    def __init__(self, latitude, longitude, year, utc_offset=None, step_minutes=SUN_TABLE_STEP_MINUTES, start_day=0):
+        # Sem fuso explícito, o do meridiano mais próximo (15° por hora)
+        self.utc_offset = round(longitude / 15.) if utc_offset is None else utc_offset
+        self.latitude, self.longitude, self.year, self.step_minutes, self.start_day = latitude, longitude, year, step_minutes, start_day
+        year_start = np.datetime64(f'{year:04d}-01-01T00:00', 'm').astype(np.int64)
+        self.days = int((np.datetime64(f'{year + 1:04d}-01-01') - np.datetime64(f'{year:04d}-01-01')).astype(np.int64))
+        self.length = int(round(self.days * 1440. / step_minutes))
+        minutes_utc = year_start + np.arange(self.length) * step_minutes - self.utc_offset * 60.
+        self.directions = sun_directions(*solar_position(minutes_utc, latitude, longitude))
+    def positions(self, hours):
+        """Posição fracionária na tabela de cada instante."""
+        minutes = (np.asarray(hours, dtype=np.float64) + self.start_day * 24.) * 60.
+        return (minutes % (self.days * 1440.)) / self.step_minutes
+    def direction(self, hours):
+        """Direções unitárias (shape de hours + (3,)) interpoladas entre as duas linhas vizinhas da tabela."""
+        position = self.positions(hours)
+        i0 = np.floor(position).astype(np.int64); frac = (position - i0)[..., None]; i0 %= self.length
+        d = self.directions[i0] + (self.directions[(i0 + 1) % self.length] - self.directions[i0]) * frac
+        return d / np.linalg.norm(d, axis=-1, keepdims=True)
+    def light(self, hours):
+        """Mesmo contrato de geracao.sun_light: direção da luz (3, T) e fator de irradiância (seno da elevação, T)."""
+        d = self.direction(np.ravel(hours))
+        return d.T, np.maximum(0., d[:, 1])
+    def position(self, hour):
+        """lightPos da cena: o ponto de referência dos painéis deslocado SUN_DISTANCE na direção do sol
+        (abaixo do chão à noite, como no modelo simplificado)."""
+        return (PANEL_REFERENCE_POINT + self.direction(hour) * SUN_DISTANCE).astype(np.float32)
+    def elevation_azimuth(self, hours):
+        """Elevação e azimute (graus) interpolados, para exibir."""
+        d = self.direction(hours)
+        return np.degrees(np.arcsin(np.clip(d[..., 1], -1., 1.))), np.degrees(np.arctan2(d[..., 2], d[..., 0])) % 360.
+
+@functools.lru_cache(maxsize=8)
+def sun_table(latitude, longitude, year, utc_offset=None, step_minutes=SUN_TABLE_STEP_MINUTES, start_day=0):
+    """SunTable compartilhada por local, ano e origem: a tabela de um ano é calculada uma vez por processo."""
+    return SunTable(latitude, longitude, year, utc_offset, step_minutes, start_day)
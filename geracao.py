@@ -0,0 +1,110 @@
+"""Modelo de geração dos painéis, sem pygame nem OpenGL.
+
+É o mesmo modelo usado pelo simulador (posição do sol, fator de irradiância, normal do painel
+pela inclinação e azimute, eficiência angular e potência nominal de PAINEL_SPECS), mas vetorizado:
+eixos de tempo inteiros (8760 horas ou 525600 minutos) são avaliados contra muitas configurações
+de uma vez com broadcasting do NumPy. Com clima medido (medicoes.py), irradiance_power_kw troca o fator de
+irradiância sintético pela irradiância no plano do painel calculada de GHI/DNI/DHI e pela temperatura.
+Todas as funções aceitam `sun`, uma tabela de efemérides (efemerides.SunTable) que troca o sol simplificado
+pela posição real num local e ano; os eixos de tempo passam então a ser horas absolutas (dia * 24 + hora).
+
+Exemplo:
+    >>> import numpy as np, geracao
+    >>> tilts = np.array([0., 20., 40.])[:, None]; azimutes = np.array([0., 90., 180.])
+    >>> geracao.energy_yield_kwh(tilts, azimutes, 610, 6).shape
+    (3, 3)
+"""
+import math
+import numpy as np
+
+# Dicionário com as especificações dos painéis
+PAINEL_SPECS = {
+    610: {'size': np.array([2.4, 0.05, 1.3]), 'wattage': 610},
+    330: {'size': np.array([2.0, 0.05, 1.0]), 'wattage': 330},
+    160: {'size': np.array([1.5, 0.05, 0.7]), 'wattage': 160}
+}
+
+SUN_MAX_HEIGHT = 30.0; SUN_RADIUS = 25.0
+# Modelo com irradiância medida: refletância do chão, NOCT (°C) e coeficiente de temperatura da potência (1/°C)
+GROUND_ALBEDO = 0.2; PANEL_NOCT = 45.0; POWER_TEMP_COEFF = -0.004
+# Sem DHI no arquivo, a parte difusa do GHI é estimada por esta fração fixa
+DIFFUSE_FRACTION = 0.3
+# Ponto de referência (altura dos painéis) usado para a direção da luz
+PANEL_REFERENCE_POINT = np.array([0., 2., 0.])
+
+def calculate_sun_position(hour,radius=SUN_RADIUS,height=SUN_MAX_HEIGHT):
+    hour_angle=(hour-6.)/12.*math.pi
+    if not(0<=hour_angle<=math.pi):return np.array([0.,-height,0.],dtype=np.float32)
+    pos_x=10.;pos_y=math.sin(hour_angle)*height;pos_z=math.cos(hour_angle)*radius
+    return np.array([pos_x,pos_y,pos_z],dtype=np.float32)
+
+def sun_positions(hours, radius=SUN_RADIUS, height=SUN_MAX_HEIGHT):
+    """Versão vetorizada de calculate_sun_position: devolve um array hours.shape + (3,). Aceita horas absolutas (dia * 24 + hora)."""
+    hour_angle = (np.asarray(hours, dtype=np.float64) % 24. - 6.) / 12. * np.pi
+    positions = np.stack([np.full_like(hour_angle, 10.), np.sin(hour_angle) * height, np.cos(hour_angle) * radius], axis=-1)
+    positions[(hour_angle < 0) | (hour_angle > np.pi)] = (0., -height, 0.)
+    return positions
+
+def sun_light(hours, radius=SUN_RADIUS, height=SUN_MAX_HEIGHT, sun=None):
+    """Direção unitária da luz (3, T) e fator de irradiância (T,) para um eixo de tempo achatado; com `sun`, da tabela de efemérides."""
+    if sun is not None: return sun.light(hours)
+    sun = sun_positions(np.ravel(hours), radius, height)
+    irradiance = np.maximum(0., sun[:, 1] / height)
+    light_dir = sun - PANEL_REFERENCE_POINT; light_dir /= np.linalg.norm(light_dir, axis=-1, keepdims=True)
+    return light_dir.T, irradiance
+
+def panel_normals(tilt, azimuth):
+    """Normal do painel (rotação de azimute aplicada a [0, cos(tilt), sin(tilt)]), com shape de broadcast + (3,)."""
+    tilt_rad = np.radians(tilt); azimuth_rad = np.radians(azimuth)
+    return np.stack(np.broadcast_arrays(np.sin(azimuth_rad) * np.sin(tilt_rad), np.cos(tilt_rad), np.cos(azimuth_rad) * np.sin(tilt_rad)), axis=-1)
+
+def power_series_kw(hours, tilt, azimuth, wattage, n_panels, radius=SUN_RADIUS, height=SUN_MAX_HEIGHT, sun=None):
+    """Potência da fazenda em kW.
+
+    tilt, azimuth, wattage e n_panels são combinados por broadcasting (shape S); o resultado tem
+    shape S + hours.shape. Com tudo escalar devolve o mesmo valor que o cálculo por quadro do simulador.
+    """
+    tilt, azimuth, wattage, n_panels = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (tilt, azimuth, wattage, n_panels)))
+    light_dir, irradiance = sun_light(hours, radius, height, sun)
+    normals = panel_normals(tilt.ravel(), azimuth.ravel())
+    rated_kw = (wattage * n_panels).ravel()[:, None] / 1000.
+    # (C, 3) @ (3, T): um único produto de matrizes para todas as configurações e instantes
+    power = rated_kw * np.maximum(normals @ light_dir, 0.) * irradiance
+    return power.reshape(tilt.shape + np.shape(hours))
+
+def irradiance_power_kw(hours, ghi, dni, dhi, temperature, tilt, azimuth, wattage, n_panels, radius=SUN_RADIUS, height=SUN_MAX_HEIGHT, sun=None):
+    """Potência da fazenda em kW a partir de irradiância medida (W/m², arrays com o shape de hours) e temperatura do ar (°C).
+
+    A irradiância no plano do painel (POA) soma o feixe direto (DNI x cosseno do ângulo de incidência, com a direção
+    do sol do modelo ou de `sun`), o difuso isotrópico (DHI x (1 + cos inclinação) / 2) e o refletido pelo chão (GHI x albedo x
+    (1 - cos inclinação) / 2). A potência é a nominal x POA / 1000 W/m², corrigida pela temperatura da célula
+    (modelo NOCT). dni e dhi podem ser None: a partição do GHI é então estimada com DIFFUSE_FRACTION.
+    Broadcasting das configurações como em power_series_kw.
+    """
+    tilt, azimuth, wattage, n_panels = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (tilt, azimuth, wattage, n_panels)))
+    light_dir, sun_factor = sun_light(hours, radius, height, sun)
+    ghi = np.ravel(ghi).astype(np.float64)
+    dhi = DIFFUSE_FRACTION * ghi if dhi is None else np.ravel(dhi).astype(np.float64)
+    # Sem DNI, o feixe direto é o que sobra do GHI dividido pelo seno da elevação (limitado perto do horizonte)
+    dni = np.where(sun_factor > 0, (ghi - dhi) / np.maximum(sun_factor, 0.1), 0.) if dni is None else np.ravel(dni).astype(np.float64)
+    normals = panel_normals(tilt.ravel(), azimuth.ravel()); cos_tilt = normals[:, 1:2]
+    cos_incidence = np.maximum(normals @ light_dir, 0.) * (sun_factor > 0)
+    poa = dni * cos_incidence + dhi * (1. + cos_tilt) / 2. + ghi * GROUND_ALBEDO * (1. - cos_tilt) / 2.
+    cell_temperature = np.ravel(temperature) + poa * (PANEL_NOCT - 20.) / 800.
+    rated_kw = (wattage * n_panels).ravel()[:, None] / 1000.
+    power = rated_kw * poa / 1000. * (1. + POWER_TEMP_COEFF * (cell_temperature - 25.))
+    return np.maximum(power, 0.).reshape(tilt.shape + np.shape(hours))
+
+def time_axis(days=365, step_minutes=60., start_hour=0.):
+    """Horas do dia (0-24) de cada passo de uma simulação de `days` dias."""
+    n_steps = int(round(days * 24 * 60 / step_minutes))
+    return (start_hour + np.arange(n_steps) * (step_minutes / 60.)) % 24.
+
+def energy_yield_kwh(tilt, azimuth, wattage, n_panels, days=365, step_minutes=60., start_hour=0., chunk_steps=65536, sun=None):
+    """Energia gerada (kWh) em `days` dias por configuração, integrada por retângulos em blocos de tempo
+    para não materializar a série inteira (C x 525600 passos) de uma vez. Com `sun` o eixo é de horas absolutas."""
+    hours = time_axis(days, step_minutes, start_hour) if sun is None else start_hour + np.arange(int(round(days * 24 * 60 / step_minutes))) * (step_minutes / 60.)
+    dt_hours = step_minutes / 60.; energy = 0.
+    for start in range(0, len(hours), chunk_steps):
+        energy = energy + power_series_kw(hours[start:start + chunk_steps], tilt, azimuth, wattage, n_panels, sun=sun).sum(axis=-1) * dt_hours
+    return energy
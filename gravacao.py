@@ -0,0 +1,111 @@
+"""Gravação de dias simulados em sequências de PNG, para relatórios.
+
+FrameWriter não usa OpenGL: recebe os pixels já lidos (Fotovoltaico.FrameCapture faz a leitura assíncrona por
+um anel de pixel buffer objects) e codifica os PNGs num pool de threads, atrás de uma fila limitada, então a
+renderização nunca espera a compressão, e a memória não cresce se os PNGs saírem mais devagar que os quadros.
+
+main() renderiza uma varredura do relógio (por padrão 24 h) fora da tela, num contexto EGL/OSMesa como o de
+desempenho.py, com passo fixo: cada quadro avança exatamente `--minutos-por-quadro` minutos simulados, qualquer
+que seja o tempo real do quadro, então a mesma linha de comando sempre produz as mesmas imagens, e tão rápido
+quanto a máquina desenha. As opções de clima, consumo e local (--clima, --consumo, --latitude...) são as do simulador,
+e o sol, o sombreamento e a geração de cada quadro vêm do mesmo Fotovoltaico.SolarFrame do laço principal.
+
+Exemplo:
+    python gravacao.py --saida dia_junho --minutos-por-quadro 2 --latitude -15.78 --longitude -47.93 --data 2001-06-21
+    ffmpeg -framerate 30 -i dia_junho/quadro_%06d.png -pix_fmt yuv420p dia_junho.mp4
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+class FrameWriter:
+    """Grava quadros RGBA (linhas de baixo para cima, como vêm do glReadPixels) como PNGs numerados num pool de
+    threads. submit bloqueia enquanto `max_pending` quadros esperam a gravação; `wait_seconds` acumula esse tempo."""
+    def __init__(self, directory, workers=None, max_pending=8, prefix='quadro', compress_level=1):
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.prefix, self.compress_level = directory, prefix, compress_level
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1)); self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock(); self.written = 0; self.errors = []; self.wait_seconds = 0.
+    def path(self, index): return os.path.join(self.directory, f'{self.prefix}_{index:06d}.png')
+    def submit(self, index, pixels):
+        start = time.perf_counter(); self.slots.acquire(); self.wait_seconds += time.perf_counter() - start
+        self.pool.submit(self._write, index, pixels).add_done_callback(self._done)
+    def _write(self, index, pixels):
+        # compress_level baixo: o PNG fica um pouco maior, mas a codificação acompanha a renderização
+        Image.fromarray(np.ascontiguousarray(pixels[::-1, :, :3])).save(self.path(index), compress_level=self.compress_level)
+    def _done(self, future):
+        self.slots.release()
+        with self.lock:
+            if future.exception() is not None: self.errors.append(future.exception())
+            else: self.written += 1
+    def close(self):
+        """Espera os quadros pendentes; devolve quantos foram gravados (a primeira falha, se houver, é relançada)."""
+        self.pool.shutdown(wait=True)
+        if self.errors: raise self.errors[0]
+        return self.written
+
+def main(argv=None):
+    from medicoes import add_data_arguments, open_data, load_model
+    parser = argparse.ArgumentParser(description="Grava uma varredura do relógio simulado como sequência de PNG, sem janela")
+    parser.add_argument('--plataforma', choices=('egl', 'osmesa'), default='egl', help="contexto OpenGL fora da tela")
+    parser.add_argument('--largura', type=int, default=1280); parser.add_argument('--altura', type=int, default=720)
+    parser.add_argument('--saida', default=time.strftime("gravacao_%Y%m%d_%H%M%S"), help="diretório dos PNGs")
+    parser.add_argument('--horas', type=float, default=24., help="horas simuladas gravadas")
+    parser.add_argument('--inicio', type=float, default=0., help="hora do primeiro quadro")
+    parser.add_argument('--minutos-por-quadro', type=float, default=2., help="passo fixo do relógio simulado por quadro")
+    parser.add_argument('--fileiras', type=int, default=4); parser.add_argument('--colunas', type=int, default=6)
+    parser.add_argument('--painel', type=int, default=610, help="potência do painel (160, 330 ou 610)")
+    parser.add_argument('--inclinacao', type=float, default=20.); parser.add_argument('--azimute', type=float, default=0.)
+    add_data_arguments(parser)
+    parser.add_argument('--anel', type=int, default=3, help="pixel buffer objects no anel de leitura")
+    parser.add_argument('--processos', type=int, help="threads de codificação dos PNGs")
+    parser.add_argument('--fila', type=int, default=8, help="quadros lidos esperando a codificação, no máximo")
+    args = parser.parse_args(argv)
+    os.environ['PYOPENGL_PLATFORM'] = args.plataforma
+    if args.plataforma == 'egl': os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+    from desempenho import create_offscreen_context, create_offscreen_framebuffer, load_sign_font
+    try: context = create_offscreen_context(args.plataforma, args.largura, args.altura)
+    except Exception as e: print(f"ERRO: não foi possível criar o contexto {args.plataforma}: {e}"); return 1
+    import pygame.freetype
+    import Fotovoltaico as app
+    from simulacao import BatterySimulator
+
+    weather, load, sun, generation = open_data(args, parser)
+    viewport = (args.largura, args.altura); specs = app.PAINEL_SPECS[args.painel]
+    texture_loader = app.TextureLoader(time.perf_counter()); renderer = app.FarmRenderer(load_sign_font(), texture_loader)
+    texture_loader.wait()
+    framebuffer = create_offscreen_framebuffer(*viewport); hud = app.HudRenderer(pygame.freetype.SysFont("Arial", 24))
+    camera = app.Camera(position=np.array([0.0, 2.5, 8.0]))
+    panel_positions = app.update_panel_positions(args.fileiras, args.colunas)
+    renderer.panel_instances.update(panel_positions, specs, args.inclinacao, args.azimute)
+    simulador = BatterySimulator(hour=args.inicio % 24., day=int(args.inicio // 24.), load_profile_kw=load_model(load, 2.0) if load is not None else None)
+    steps_per_frame = int(round(args.minutos_por_quadro * 60. / simulador.step_seconds))
+    n_frames = int(round(args.horas * 60. / args.minutos_por_quadro)); solar = app.SolarFrame(sun, generation)
+    capture = app.FrameCapture(FrameWriter(args.saida, args.processos, args.fila), *viewport, ring=args.anel)
+    print(f"Gravando {n_frames} quadros {args.largura}x{args.altura} ({args.minutos_por_quadro:g} min simulados por quadro) em {args.saida}/")
+    started = time.perf_counter()
+    for k in range(n_frames):
+        # Mesma lógica por quadro do laço principal, com o relógio andando um passo fixo
+        frame = solar.update(simulador.absolute_hour, args.fileiras, args.colunas, panel_positions, args.painel, args.inclinacao, args.azimute)
+        renderer.sign.update(frame.power_kw)
+        renderer.draw(camera, frame.light_pos, frame.shadow_key, simulador.percentage, viewport, framebuffer=framebuffer)
+        # Arredondado ao minuto: com o passo em segundos, 11:30 pode chegar como 11,4999... h
+        minutes = int(round(simulador.absolute_hour * 60.))
+        hud.text.set_line('hora', f"Dia {minutes // 1440 + 1} {minutes // 60 % 24:02d}:{minutes % 60:02d}", (10, 10))
+        hud.text.set_line('geracao', f"Geração Placas: {frame.power_kw:.2f} kW", (10, args.altura - 30))
+        hud.text.set_line('consumo', f"Consumo Fazenda: {simulador.current_load_kw:.2f} kW", (10, args.altura - 60))
+        hud.text.set_line('bateria', f"Bateria: {simulador.current_kwh:.2f}/{simulador.capacity_kwh:.1f} kWh ({simulador.percentage:.1f}%) {simulador.status}", (10, args.altura - 90))
+        hud.draw(*viewport)
+        capture.capture(framebuffer)
+        simulador.step(steps_per_frame, frame.generation_kw)
+    written = capture.finish(); elapsed = time.perf_counter() - started
+    print(f"{written} quadros em {elapsed:.1f} s ({written / elapsed:.1f} quadros/s, {args.horas * 3600. / elapsed:.0f}x o tempo real; "
+          f"{capture.writer.wait_seconds:.1f} s esperando a fila de PNGs)")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
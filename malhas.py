@@ -0,0 +1,65 @@
+"""Geração vetorizada das malhas indexadas (cilindro e esfera), com cache em disco.
+
+Cada malha é um par (vértices (N, 8) float32 com posição/normal/uv, índices uint32), desenhado com
+glDrawElements. As malhas geradas ficam em arquivos .npy abertos com memória mapeada, um por combinação
+de parâmetros de tesselação, então a partida a frio e níveis de detalhe maiores não refazem a geometria.
+"""
+import os
+import numpy as np
+
+MESH_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'meshes')
+MESH_CACHE_VERSION = 1
+
+def generate_cylinder_mesh(radius=0.5, height=1.0, sides=16):
+    angles = np.arange(sides + 1) / sides * 2 * np.pi
+    x, z = radius * np.cos(angles), radius * np.sin(angles); u = np.arange(sides + 1) / sides
+    # Lateral: (sides + 1) colunas x 2 anéis (topo, base); a última coluna repete a primeira com u = 1
+    side = np.zeros((2, sides + 1, 8), dtype=np.float32)
+    side[..., 0] = x; side[..., 2] = z; side[0, :, 1] = height / 2; side[1, :, 1] = -height / 2
+    side[..., 3] = x; side[..., 5] = z; side[..., 6] = u; side[0, :, 7] = 1
+    # Tampas: centro + anel com normal para cima/baixo e uv planar
+    caps = np.zeros((2, sides + 2, 8), dtype=np.float32)
+    for cap, (y, ny) in enumerate(((height / 2, 1), (-height / 2, -1))):
+        caps[cap, :, 1] = y; caps[cap, :, 4] = ny; caps[cap, 0, 6:8] = 0.5
+        caps[cap, 1:, 0] = x; caps[cap, 1:, 2] = z; caps[cap, 1:, 6] = x + 0.5; caps[cap, 1:, 7] = z + 0.5
+    vertices = np.concatenate([side.reshape(-1, 8), caps.reshape(-1, 8)])
+    i = np.arange(sides); top, bottom = i, (sides + 1) + i
+    side_indices = np.stack([top, bottom, top + 1, top + 1, bottom, bottom + 1], axis=-1)
+    top_center = 2 * (sides + 1); bottom_center = top_center + sides + 2
+    top_indices = np.stack([np.full(sides, top_center), top_center + 1 + i, top_center + 2 + i], axis=-1)
+    bottom_indices = np.stack([np.full(sides, bottom_center), bottom_center + 2 + i, bottom_center + 1 + i], axis=-1)
+    indices = np.concatenate([side_indices.ravel(), np.stack([top_indices, bottom_indices], axis=1).ravel()]).astype(np.uint32)
+    return vertices, indices
+
+def generate_sphere_mesh(radius=1.0, sectors=36, stacks=18):
+    stack_angle = np.pi / 2 - np.arange(stacks + 1) * np.pi / stacks
+    sector_angle = np.arange(sectors + 1) * 2 * np.pi / sectors
+    xy = radius * np.cos(stack_angle)[:, None]; y = np.broadcast_to(radius * np.sin(stack_angle)[:, None], (stacks + 1, sectors + 1))
+    x = xy * np.cos(sector_angle); z = xy * np.sin(sector_angle)
+    u, v = np.meshgrid(np.arange(sectors + 1) / sectors, np.arange(stacks + 1) / stacks)
+    vertices = np.stack([x, y, z, x / radius, y / radius, z / radius, u, v], axis=-1).reshape(-1, 8).astype(np.float32)
+    k1 = (np.arange(stacks) * (sectors + 1))[:, None] + np.arange(sectors); k2 = k1 + sectors + 1
+    upper = np.stack([k1, k2, k1 + 1], axis=-1); lower = np.stack([k1 + 1, k2, k2 + 1], axis=-1)
+    # Mesma ordem do laço original: por faixa e setor, o triângulo de cima (exceto no polo norte) e o de baixo (exceto no polo sul)
+    keep_upper = np.broadcast_to((np.arange(stacks) != 0)[:, None, None], upper.shape); keep_lower = np.broadcast_to((np.arange(stacks) != stacks - 1)[:, None, None], lower.shape)
+    triangles = np.concatenate([upper, lower], axis=-1); keep = np.concatenate([keep_upper, keep_lower], axis=-1)
+    return vertices, triangles[keep].astype(np.uint32)
+
+MESH_GENERATORS = {'cylinder': generate_cylinder_mesh, 'sphere': generate_sphere_mesh}
+
+def cached_mesh(kind, **params):
+    """Malha `kind` com os parâmetros dados, lida do cache .npy com memória mapeada ou gerada e gravada nele."""
+    key = '_'.join([kind, f'v{MESH_CACHE_VERSION}'] + [f'{name}{params[name]}' for name in sorted(params)])
+    paths = [os.path.join(MESH_CACHE_DIR, f'{key}_{part}.npy') for part in ('vertices', 'indices')]
+    try: return tuple(np.load(path, mmap_mode='r') for path in paths)
+    except (OSError, ValueError): pass
+    mesh = MESH_GENERATORS[kind](**params)
+    try:
+        os.makedirs(MESH_CACHE_DIR, exist_ok=True)
+        for path, array in zip(paths, mesh):
+            # Grava em arquivo temporário e renomeia, para outro processo nunca ler um .npy pela metade
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f: np.save(f, array)
+            os.replace(temp_path, path)
+    except OSError: pass
+    return mesh
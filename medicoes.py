@@ -0,0 +1,337 @@
+"""Séries medidas de clima (TMY / estação) e de consumo, com cache colunar em memória mapeada, sem OpenGL.
+
+ingest_csv lê o CSV em blocos de linhas (nunca o arquivo inteiro), reconhece as colunas pelos nomes usuais
+(NREL TMY3, NSRDB, PVGIS ou CSV simples com data/hora ISO) e converte tudo uma vez para uma grade regular:
+um .npy float32 por grandeza em .cache/series/, mais um meta.json com o início, o passo e o fuso dos instantes. As
+execuções seguintes abrem esses arquivos com memória mapeada, sem reler o texto. Como a grade é regular, o valor
+num instante é achado por aritmética (índice = (t - início) / passo), em O(1), e só as páginas tocadas são lidas do disco.
+
+Arquivos em UTC (PVGIS 'time(UTC)', NSRDB com colunas Year/Month/Day/Hour, ISO com 'Z' ou '+hh:mm') ficam em UTC no
+cache; MeasuredSeries os leva à hora local padrão do simulador. TMY3 e ISO sem fuso já são hora local.
+
+Exemplo:
+    >>> clima = medicoes.ingest_csv('tmy_brasilia.csv', typical_year=True)
+    >>> clima.sample('ghi', np.array([12., 36.]))        # W/m² ao meio-dia do 1º e do 2º dia
+"""
+import csv
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import numpy as np
+from geracao import power_series_kw, irradiance_power_kw
+from efemerides import sun_table
+
+SERIES_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'series')
+SERIES_CACHE_VERSION = 3
+# Nomes aceitos para cada grandeza (minúsculos, sem a unidade entre parênteses) e o fator para a unidade do cache
+COLUMN_ALIASES = {
+    'ghi': ({'ghi', 'g(h)', 'globalhorizontal', 'global_horizontal', 'ghi_wm2'}, 1.),
+    'dni': ({'dni', 'gb(n)', 'directnormal', 'direct_normal', 'dni_wm2'}, 1.),
+    'dhi': ({'dhi', 'gd(h)', 'diffusehorizontal', 'diffuse_horizontal', 'dhi_wm2'}, 1.),
+    'temp_air': ({'temp_air', 'temperature', 'temp', 't2m', 'dry-bulb', 'tamb', 'air_temperature', 'temperatura'}, 1.),
+    'load_kw': ({'load_kw', 'load', 'consumo_kw', 'consumo', 'power_kw', 'demand_kw', 'kw'}, 1.),
+    'load_w': ({'load_w', 'power_w', 'consumo_w', 'w'}, 1e-3),
+}
+TIMESTAMP_ALIASES = {'timestamp', 'time', 'datetime', 'date_time', 'data_hora', 'time(utc)', 'time_utc', 'date', 'data'}
+UTC_TIMESTAMP_COLUMNS = {'time(utc)', 'time_utc'}
+ISO_UTC_OFFSET = re.compile(r'\d{2}:\d{2}(?::\d{2}(?:\.\d*)?)?(Z|([+-])(\d{2}):?(\d{2}))$')
+DATE_PART_COLUMNS = ('year', 'month', 'day', 'hour', 'minute')
+EPOCH_2001 = np.datetime64('2001-01-01T00:00', 'm').astype(np.int64)
+INVALID_TIME = np.iinfo(np.int64).min
+
+def _normalize(name):
+    return re.sub(r'\s+\(.*\)$', '', name.strip().lower())
+
+def _to_float(strings):
+    try: return np.asarray(strings, dtype=np.float64)
+    except ValueError:
+        values = np.full(len(strings), np.nan)
+        for i, s in enumerate(strings):
+            try: values[i] = float(s)
+            except ValueError: pass
+        return values
+
+def _iso_offset_minutes(string):
+    """Fuso de uma data/hora ISO em minutos a leste de UTC ('Z' -> 0, '-03:00' -> -180); None sem fuso."""
+    match = ISO_UTC_OFFSET.search(string.strip())
+    if match is None: return None
+    if match.group(1) == 'Z': return 0
+    return (1 if match.group(2) == '+' else -1) * (int(match.group(3)) * 60 + int(match.group(4)))
+
+def _iso_minutes(strings, utc=False):
+    """Minutos desde 1970 de datas/horas ISO. Segundos são descartados; com utc, cada linha com fuso é levada a UTC."""
+    strings = np.char.strip(np.asarray(strings, dtype=str))
+    # Corta em 16 caracteres ('2020-01-01 10:00:00+00:00' -> '2020-01-01T10:00')
+    iso = np.char.replace(strings, ' ', 'T').astype('U16')
+    try: out = iso.astype('datetime64[m]').astype(np.int64)
+    except ValueError:
+        out = np.full(len(iso), INVALID_TIME)
+        for i, s in enumerate(iso):
+            try: out[i] = np.datetime64(s, 'm').astype(np.int64)
+            except ValueError: pass
+    if utc:
+        offsets = np.array([_iso_offset_minutes(s) or 0 for s in strings], dtype=np.int64)
+        out = np.where(out != INVALID_TIME, out - offsets, INVALID_TIME)
+    return out
+
+def _parts_minutes(year, month, day, hour, minute):
+    """Minutos desde 1970 de componentes numéricos (hora 24:00 vira 00:00 do dia seguinte, como no TMY3)."""
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]').astype(np.int64) + day - 1
+    return days * 1440 + hour * 60 + minute
+
+def _timestamp_parser(names, first_row):
+    """Função (linhas do bloco) -> minutos desde 1970 e o fuso desses minutos (0 para UTC, None para hora local),
+    escolhidos pelos nomes das colunas e pela primeira linha de dados."""
+    index = {name: i for i, name in enumerate(names)}
+    if all(part in index for part in DATE_PART_COLUMNS[:4]):
+        # NSRDB: componentes em UTC
+        cols = [index.get(part) for part in DATE_PART_COLUMNS]
+        def parts(rows):
+            values = [_to_float([r[c] for r in rows]) if c is not None else np.zeros(len(rows)) for c in cols]
+            valid = np.all([np.isfinite(v) for v in values], axis=0); values = [np.where(valid, v, 0).astype(np.int64) for v in values]
+            return np.where(valid, _parts_minutes(*values), INVALID_TIME)
+        return parts, 0
+    if 'date' in index and 'time' in index and '/' in first_row[index['date']]:
+        date_col, time_col = index['date'], index['time']
+        def tmy3(rows):
+            # 'MM/DD/AAAA' + 'HH:MM'
+            dates = np.char.split(np.asarray([r[date_col] for r in rows], dtype=str), '/'); times = np.char.split(np.asarray([r[time_col] for r in rows], dtype=str), ':')
+            month, day, year = (np.array([int(d[k]) for d in dates]) for k in range(3)); hour, minute = (np.array([int(t[k]) for t in times]) for k in range(2))
+            return _parts_minutes(year, month, day, hour, minute)
+        return tmy3, None
+    column = next((index[name] for name in names if name in TIMESTAMP_ALIASES), None)
+    if column is None: raise ValueError("nenhuma coluna de data/hora reconhecida")
+    utc = names[column] in UTC_TIMESTAMP_COLUMNS
+    if re.fullmatch(r'\d{8}:\d{4}', first_row[column].strip()):
+        def pvgis(rows):
+            # 'AAAAMMDD:HHMM'; linhas de rodapé do PVGIS viram tempo inválido e são descartadas
+            values = [r[column].strip() for r in rows]; ok = np.array([bool(re.fullmatch(r'\d{8}:\d{4}', v)) for v in values])
+            digits = [v if k else '19700101:0000' for v, k in zip(values, ok)]
+            year, month, day, hour, minute = (np.array([int(v[a:b]) for v in digits]) for a, b in ((0, 4), (4, 6), (6, 8), (9, 11), (11, 13)))
+            return np.where(ok, _parts_minutes(year, month, day, hour, minute), INVALID_TIME)
+        return pvgis, 0 if utc else None
+    utc = utc or _iso_offset_minutes(first_row[column]) is not None
+    return (lambda rows: _iso_minutes([r[column] for r in rows], utc)), 0 if utc else None
+
+def _find_header(reader, max_lines=100):
+    """Pula as linhas de metadados até o cabeçalho com uma coluna de tempo e ao menos uma grandeza conhecida."""
+    for _ in range(max_lines):
+        row = next(reader, None)
+        if row is None: break
+        names = [_normalize(name) for name in row]
+        columns = {}
+        for canonical, (aliases, scale) in COLUMN_ALIASES.items():
+            column = next((i for i, name in enumerate(names) if name in aliases), None)
+            if column is not None: columns[canonical] = (column, scale)
+        has_time = any(name in TIMESTAMP_ALIASES for name in names) or all(part in names for part in DATE_PART_COLUMNS[:4])
+        if columns and has_time:
+            if 'load_w' in columns:
+                column = columns.pop('load_w'); columns.setdefault('load_kw', column)
+            return names, columns
+    raise ValueError("cabeçalho não encontrado (precisa de data/hora e de GHI, DNI, DHI, temperatura ou consumo)")
+
+def _typical_year(minutes):
+    """Leva cada instante ao mesmo dia e hora de 2001 (ano-padrão não bissexto); 29/02 vira tempo inválido."""
+    t = minutes.astype('datetime64[m]'); year_start = t.astype('datetime64[Y]')
+    offset = minutes - year_start.astype('datetime64[m]').astype(np.int64); year = year_start.astype(np.int64) + 1970
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    feb29 = leap & (offset >= 59 * 1440) & (offset < 60 * 1440)
+    offset = np.where(leap & (offset >= 60 * 1440), offset - 1440, offset)
+    return np.where(feb29, INVALID_TIME, EPOCH_2001 + offset)
+
+def _fill_gaps(grid, max_gap, chunk_rows):
+    """Interpola linearmente as células NaN entre duas amostras a no máximo `max_gap` células uma da outra (grade mais
+    fina que o arquivo); buracos maiores, falhas da medição, continuam NaN. Em blocos, com `max_gap` de sobra nas bordas."""
+    for start in range(0, len(grid), chunk_rows):
+        low = max(0, start - max_gap); window = np.asarray(grid[low:start + chunk_rows + max_gap], dtype=np.float64)
+        known = np.flatnonzero(~np.isnan(window))
+        if len(known) < 2: continue
+        cells = np.arange(start, min(len(grid), start + chunk_rows)) - low; after = np.searchsorted(known, cells)
+        prev = known[np.maximum(after - 1, 0)]; following = known[np.minimum(after, len(known) - 1)]
+        fill = np.isnan(window[cells]) & (after > 0) & (after < len(known)) & (following - prev <= max_gap)
+        grid[cells[fill] + low] = np.interp(cells[fill], known, window[known])
+
+def _same_day_in_year(day, year):
+    """O mesmo mês e dia de `day` em `year` (29/02 num ano não bissexto vira 28/02)."""
+    month = day.astype('datetime64[M]'); month_in_year = int(month.astype(np.int64)) % 12
+    target_month = np.datetime64(f'{year:04d}-01', 'M') + month_in_year
+    last_day = int(((target_month + 1).astype('datetime64[D]') - target_month.astype('datetime64[D]')).astype(np.int64))
+    return target_month.astype('datetime64[D]') + min(int((day - month.astype('datetime64[D]')).astype(np.int64)), last_day - 1)
+
+class MeasuredSeries:
+    """Série regular aberta do cache: uma coluna float32 com memória mapeada por grandeza, amostra i no instante
+    start_minutes + i * step_minutes (minutos desde 1970, no fuso utc_offset_minutes do arquivo). As consultas usam
+    horas contadas a partir da meia-noite de anchor_minutes na hora local padrão do simulador (UTC + utc_offset horas),
+    o mesmo relógio absoluto do simulador, e dão a volta no fim da série. anchor_minutes é o primeiro dia da série até
+    align levá-lo ao dia 0 do simulador. Sem utc_offset, ou com o arquivo já em hora local, os instantes do arquivo
+    valem como estão."""
+    def __init__(self, directory, utc_offset=None):
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f: meta = json.load(f)
+        self.directory = directory; self.source = meta['source']; self.utc_offset_minutes = meta['utc_offset_minutes']
+        self.start_minutes, self.step_minutes, self.length = meta['start_minutes'], meta['step_minutes'], meta['length']
+        self.columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in meta['columns']}
+        # Minutos somados aos instantes do arquivo para chegar à hora local do simulador
+        self.shift_minutes = 0 if self.utc_offset_minutes is None or utc_offset is None else int(round(utc_offset * 60.)) - self.utc_offset_minutes
+        local_start = self.start_minutes + self.shift_minutes
+        self.anchor_minutes = local_start - local_start % 1440; self.period_minutes = self.length * self.step_minutes
+    def first_day(self):
+        """Primeiro dia (hora local) da série."""
+        return np.datetime64(int(self.start_minutes + self.shift_minutes), 'm').astype('datetime64[D]')
+    def align(self, day):
+        """Põe a hora 0 das consultas na meia-noite de `day` (o dia 0 do simulador): na própria data, se a série a
+        cobre, senão no mesmo mês e dia de um ano da série (anos típicos, medições de outro ano). Devolve o dia da série
+        usado, ou None se nenhum ano da série tem essa data (a série fica no primeiro dia)."""
+        local_start = self.start_minutes + self.shift_minutes; local_end = local_start + self.period_minutes
+        first_year = int(self.first_day().astype('datetime64[Y]').astype(np.int64)) + 1970
+        day = np.datetime64(day, 'D')
+        candidates = [day] + [_same_day_in_year(day, year) for year in range(first_year, first_year + int(self.period_minutes // 525600) + 2)]
+        for candidate in candidates:
+            minutes = int(candidate.astype('datetime64[m]').astype(np.int64))
+            if local_start - 1440 < minutes < local_end:
+                self.anchor_minutes = minutes; return candidate
+        return None
+    def positions(self, hours):
+        """Posição fracionária na grade de cada instante (horas desde a meia-noite do primeiro dia, hora local)."""
+        minutes = self.anchor_minutes + np.asarray(hours, dtype=np.float64) * 60. - self.shift_minutes - self.start_minutes
+        return (minutes % self.period_minutes) / self.step_minutes
+    def timestamp(self, hours):
+        """Data e hora local da série no instante (já com a volta no fim), para exibir."""
+        return np.datetime64(int(self.start_minutes + self.shift_minutes + np.floor(self.positions(hours) * self.step_minutes)), 'm')
+    def sample(self, name, hours, fill=np.nan):
+        """Valores interpolados linearmente entre as duas amostras vizinhas; faltando uma, vale a outra, faltando as duas, `fill`."""
+        column = self.columns[name]; position = self.positions(hours)
+        i0 = np.floor(position).astype(np.int64); frac = position - i0; i0 %= self.length; i1 = (i0 + 1) % self.length
+        a = column[i0].astype(np.float64); b = column[i1].astype(np.float64)
+        value = np.where(np.isnan(a), b, np.where(np.isnan(b), a, a + (b - a) * frac))
+        return np.where(np.isnan(value), fill, value)
+
+def _cache_directory(path, step_minutes, typical_year, cache_dir):
+    stat = os.stat(path)
+    key = hashlib.sha1(f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{step_minutes}|{typical_year}|v{SERIES_CACHE_VERSION}'.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(path))[0]}_{key}')
+
+def ingest_csv(path, step_minutes=None, typical_year=False, utc_offset=None, chunk_rows=65536, cache_dir=SERIES_CACHE_DIR):
+    """MeasuredSeries do CSV, lida do cache ou convertida agora. O passo da grade é `step_minutes` ou o do próprio arquivo
+    (o menor intervalo entre linhas). Com passo maior, cada célula é a média das amostras em volta do seu instante; com
+    passo menor, as células entre duas amostras seguidas são interpoladas. typical_year leva tudo a 2001 (arquivos TMY
+    com meses de anos diferentes). utc_offset é o fuso (horas) da hora local padrão do simulador, para arquivos em UTC."""
+    directory = _cache_directory(path, step_minutes, typical_year, cache_dir)
+    try: return MeasuredSeries(directory, utc_offset)
+    except (OSError, ValueError, KeyError): pass
+    temp_dir = f'{directory}.{os.getpid()}.tmp'; os.makedirs(temp_dir, exist_ok=True)
+    try:
+        # 1ª passada: tempos e valores de cada bloco anexados a arquivos binários brutos, com memória limitada ao bloco
+        with open(path, newline='', encoding='utf-8-sig', errors='replace') as f:
+            reader = csv.reader(f); names, columns = _find_header(reader); parser = None
+            raw = {name: open(os.path.join(temp_dir, f'{name}.raw'), 'wb') for name in ['time'] + list(columns)}
+            first = last = native = None
+            while True:
+                chunk = list(itertools.islice(reader, chunk_rows))
+                if not chunk: break
+                # Linhas curtas (rodapés, linhas em branco) ficam de fora
+                rows = [row for row in chunk if len(row) >= len(names)]
+                if not rows: continue
+                if parser is None: parser, source_offset = _timestamp_parser(names, rows[0])
+                minutes = parser(rows)
+                if typical_year: minutes = np.where(minutes != INVALID_TIME, _typical_year(np.where(minutes != INVALID_TIME, minutes, 0)), INVALID_TIME)
+                valid = minutes != INVALID_TIME; minutes = minutes[valid]
+                if not len(minutes): continue
+                raw['time'].write(minutes.astype(np.int64).tobytes())
+                for name, (column, scale) in columns.items():
+                    raw[name].write((_to_float([row[column] for row in rows])[valid] * scale).astype(np.float32).tobytes())
+                first = minutes.min() if first is None else min(first, minutes.min()); last = minutes.max() if last is None else max(last, minutes.max())
+                steps = np.diff(np.unique(minutes)); steps = steps[steps > 0]
+                if len(steps): native = int(steps.min()) if native is None else min(native, int(steps.min()))
+            for file in raw.values(): file.close()
+        if first is None: raise ValueError(f"nenhuma linha de dados válida em {path}")
+        native = native or 60; step = int(step_minutes or native)
+        # Célula i cobre [início + (i - 1/2) passo, início + (i + 1/2) passo); o comprimento usa o mesmo arredondamento do índice
+        cell_of = lambda t: ((t - first) / step + 0.5).astype(np.int64); length = int(cell_of(np.array([last]))[0]) + 1
+        # 2ª passada: soma e contagem por célula (amostras NaN ficam de fora), também em blocos; a média vai para a grade
+        times = np.memmap(os.path.join(temp_dir, 'time.raw'), dtype=np.int64, mode='r')
+        for name in columns:
+            values = np.memmap(os.path.join(temp_dir, f'{name}.raw'), dtype=np.float32, mode='r')
+            sums = np.memmap(os.path.join(temp_dir, 'sums.raw'), dtype=np.float64, mode='w+', shape=(length,))
+            counts = np.memmap(os.path.join(temp_dir, 'counts.raw'), dtype=np.int64, mode='w+', shape=(length,))
+            for start in range(0, len(times), chunk_rows):
+                cells = cell_of(times[start:start + chunk_rows]); block = values[start:start + chunk_rows].astype(np.float64)
+                ok = np.isfinite(block); cells = cells[ok]; block = block[ok]
+                if not len(cells): continue
+                low = cells.min(); span = int(cells.max() - low) + 1
+                sums[low:low + span] += np.bincount(cells - low, weights=block, minlength=span); counts[low:low + span] += np.bincount(cells - low, minlength=span)
+            grid = np.lib.format.open_memmap(os.path.join(temp_dir, f'{name}.npy'), mode='w+', dtype=np.float32, shape=(length,))
+            for start in range(0, length, chunk_rows):
+                n = counts[start:start + chunk_rows]; grid[start:start + chunk_rows] = np.where(n > 0, sums[start:start + chunk_rows] / np.maximum(n, 1), np.nan)
+            if step < native: _fill_gaps(grid, -(-native // step), chunk_rows)
+            grid.flush(); del grid, values, sums, counts
+        del times
+        for name in ['time', 'sums', 'counts'] + list(columns): os.remove(os.path.join(temp_dir, f'{name}.raw'))
+        with open(os.path.join(temp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'source': os.path.abspath(path), 'start_minutes': int(first), 'step_minutes': step, 'length': length,
+                       'utc_offset_minutes': source_offset, 'columns': list(columns)}, f)
+        # Renomeia o diretório pronto de uma vez, para outro processo nunca abrir um cache pela metade
+        try: os.replace(temp_dir, directory)
+        except OSError: shutil.rmtree(temp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True); raise
+    return MeasuredSeries(directory, utc_offset)
+
+def generation_model(weather=None, sun=None):
+    """Função (horas, inclinação, azimute, potência, painéis) -> kW: do clima medido, se houver, senão do modelo sintético,
+    com o sol de `sun` (efemerides.SunTable) ou o simplificado. Sem DNI/DHI no arquivo a partição do GHI é estimada;
+    sem temperatura, vale 25 °C."""
+    if weather is None or 'ghi' not in weather.columns:
+        return lambda hours, tilt, azimuth, wattage, n_panels: power_series_kw(hours, tilt, azimuth, wattage, n_panels, sun=sun)
+    def measured(hours, tilt, azimuth, wattage, n_panels):
+        optional = {name: weather.sample(name, hours, 0.) if name in weather.columns else None for name in ('dni', 'dhi')}
+        temperature = weather.sample('temp_air', hours, 25.) if 'temp_air' in weather.columns else 25.
+        return irradiance_power_kw(hours, weather.sample('ghi', hours, 0.), optional['dni'], optional['dhi'], temperature, tilt, azimuth, wattage, n_panels, sun=sun)
+    return measured
+
+def load_model(load, default_kw):
+    """Perfil de consumo (horas -> kW) da série medida; lacunas usam default_kw."""
+    return lambda hours: load.sample('load_kw', hours, default_kw)
+
+def add_data_arguments(parser):
+    """Opções de clima e consumo medidos e do local (sol real), comuns à janela (Fotovoltaico.py) e à gravação (gravacao.py)."""
+    parser.add_argument('--clima', help="CSV de clima medido (TMY3, NSRDB, PVGIS ou data/hora ISO com GHI e, se houver, DNI, DHI e temperatura)")
+    parser.add_argument('--consumo', help="CSV de consumo medido (data/hora e kW ou W)")
+    parser.add_argument('--ano-tipico', action='store_true', help="leva as datas do clima a um ano-padrão (arquivos TMY com meses de anos diferentes)")
+    parser.add_argument('--passo-clima', type=int, help="passo em minutos da grade do cache do clima (padrão: o do próprio arquivo)")
+    parser.add_argument('--passo-consumo', type=int, help="passo em minutos da grade do cache do consumo (padrão: o do próprio arquivo)")
+    parser.add_argument('--latitude', type=float, help="latitude do local em graus (negativa no sul); com --longitude, usa a posição real do sol")
+    parser.add_argument('--longitude', type=float, help="longitude do local em graus (negativa a oeste)")
+    parser.add_argument('--fuso', type=float, help="fuso horário da hora local padrão em horas (padrão: longitude / 15); leva à hora local os arquivos em UTC")
+    parser.add_argument('--data', help="data do 1º dia simulado, AAAA-MM-DD (padrão: início do clima medido ou 2001-01-01)")
+
+def open_data(args, parser):
+    """Séries medidas, tabela do sol e modelo de geração (weather, load, sun, generation) das opções de add_data_arguments."""
+    if (args.latitude is None) != (args.longitude is None): parser.error("--latitude e --longitude vão juntas")
+    # Os CSVs são convertidos uma vez para o cache em .cache/series; as execuções seguintes só abrem os .npy
+    utc_offset = args.fuso if args.fuso is not None else round(args.longitude / 15.) if args.longitude is not None else None
+    weather = ingest_csv(args.clima, args.passo_clima, args.ano_tipico, utc_offset) if args.clima else None
+    load = ingest_csv(args.consumo, args.passo_consumo, utc_offset=utc_offset) if args.consumo else None
+    for name, series in ((args.clima, weather), (args.consumo, load)):
+        if series is not None and series.utc_offset_minutes is not None and utc_offset is None:
+            print(f"Aviso: {name} está em UTC; sem --fuso ou --longitude os horários valem como hora local")
+    if load is not None and 'load_kw' not in load.columns: parser.error(f"{args.consumo} não tem coluna de consumo")
+    # Sol, clima e consumo no mesmo calendário: o dia 0 do simulador é --data, ou o primeiro dia do clima (ou do consumo)
+    origin = np.datetime64(args.data, 'D') if args.data else weather.first_day() if weather is not None else load.first_day() if load is not None else np.datetime64('2001-01-01')
+    for name, series in ((args.clima, weather), (args.consumo, load)):
+        if series is None: continue
+        used = series.align(origin)
+        # Sem o dia no clima, o sol e a irradiância seriam de datas diferentes
+        if used is None and series is weather: parser.error(f"{name} não tem o dia {origin} (nem o mesmo mês e dia em outro ano)")
+        if used is None: print(f"Aviso: {name} não tem o dia {origin}; a série começa em {series.first_day()}, fora do calendário do simulador")
+        elif used != origin: print(f"{name}: dia {origin} lido de {used} (mesmo mês e dia)")
+    # Sol real: tabela de efemérides do ano da data inicial, com o dia 0 do simulador nessa data
+    sun = None
+    if args.latitude is not None:
+        year = int(origin.astype('datetime64[Y]').astype(np.int64)) + 1970
+        sun = sun_table(args.latitude, args.longitude, year, utc_offset, start_day=int((origin - np.datetime64(f'{year:04d}-01-01')).astype(np.int64)))
+    generation = generation_model(weather, sun)
+    return weather, load, sun, generation
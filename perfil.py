@@ -0,0 +1,56 @@
+"""Tempos por quadro do simulador, sem OpenGL.
+
+StageTimer cronometra na CPU as etapas consecutivas de um quadro; FrameTimings guarda os últimos quadros numa
+janela circular, calcula média, p95 e p99 de cada coluna e, se pedido, grava cada quadro numa linha de CSV.
+As consultas de GPU (GL_TIME_ELAPSED) ficam no simulador e entram aqui como colunas comuns.
+"""
+import csv
+import time
+import warnings
+import numpy as np
+
+class StageTimer:
+    """Cronômetro de CPU das etapas de um quadro: stage('nome') fecha a etapa aberta e abre a próxima,
+    end_frame() devolve os ms de cada etapa e do quadro inteiro ('quadro')."""
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock; self.values = {}; self._name = None; self._start = self._frame_start = None
+    def stage(self, name):
+        now = self.clock()
+        if self._name is not None: self.values[self._name] = self.values.get(self._name, 0.) + (now - self._start) * 1000.
+        if self._frame_start is None: self._frame_start = now
+        self._name = name; self._start = now
+        return now
+    def end_frame(self):
+        now = self.stage(None); values = self.values
+        if self._frame_start is not None: values['quadro'] = (now - self._frame_start) * 1000.
+        self.values = {}; self._frame_start = None
+        return values
+
+class FrameTimings:
+    """Janela circular dos tempos (ms) dos últimos `window` quadros, uma coluna por nome de `columns`."""
+    def __init__(self, columns, window=300):
+        self.columns = list(columns); self.index = {name: i for i, name in enumerate(self.columns)}
+        self.samples = np.full((window, len(self.columns)), np.nan); self.frames = 0
+        self.csv_path = None; self._csv_file = self._csv_writer = None
+    def record(self, frame, values):
+        """Guarda os tempos do quadro `frame`; colunas ausentes ficam nan (vazias no CSV)."""
+        row = self.samples[frame % len(self.samples)]; row[:] = np.nan
+        for name, ms in values.items():
+            if name in self.index: row[self.index[name]] = ms
+        self.frames = max(self.frames, frame + 1)
+        if self._csv_writer: self._csv_writer.writerow([frame] + ['' if np.isnan(v) else f'{v:.4f}' for v in row])
+    def summary(self):
+        """(média, p95, p99) de cada coluna sobre a janela, em ms; nan nas colunas sem amostra."""
+        samples = self.samples[:min(self.frames, len(self.samples))]
+        if not len(samples): return (np.full(len(self.columns), np.nan),) * 3
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return (np.nanmean(samples, axis=0),) + tuple(np.nanpercentile(samples, [95, 99], axis=0))
+    def start_csv(self, path):
+        self.stop_csv(); self.csv_path = path
+        self._csv_file = open(path, 'w', newline='', encoding='utf-8'); self._csv_writer = csv.writer(self._csv_file)
+        self._csv_writer.writerow(['frame'] + self.columns)
+    def stop_csv(self):
+        if self._csv_file: self._csv_file.close()
+        path = self.csv_path; self.csv_path = None; self._csv_file = self._csv_writer = None
+        return path
@@ -0,0 +1,75 @@
+"""Simulação da bateria e da carga da fazenda em passo fixo, desacoplada da taxa de quadros.
+
+O relógio simulado avança em passos de `step_seconds`; a aceleração (1x a 10000x) só muda quantos
+passos são executados por quadro, e todos os passos de um quadro são calculados de uma vez com NumPy.
+O renderizador apenas lê o estado mais recente. O relógio é absoluto (dia * 24 + hora), para que séries
+medidas de geração e consumo (medicoes.py) possam ser consultadas em qualquer ponto de um ano.
+"""
+import numpy as np
+
+TIME_SPEEDS = (1, 10, 100, 1000, 10000)
+
+def saturating_cumsum(start, deltas, low, high):
+    """x[k] = clip(x[k-1] + deltas[k], low, high), com x[-1] = start.
+
+    Entre saturações a série é uma soma acumulada comum; o laço em Python só roda a cada evento de
+    saturação, e trechos em que os deltas continuam empurrando contra o limite atingido são pulados de uma vez.
+    """
+    deltas = np.asarray(deltas, dtype=np.float64); n = len(deltas); out = np.empty(n)
+    sums = np.cumsum(deltas); i = 0; x = float(start)
+    while i < n:
+        segment = x - (sums[i - 1] if i else 0.) + sums[i:]
+        outside = (segment < low) | (segment > high)
+        k = int(np.argmax(outside)) if outside.any() else n - i
+        out[i:i + k] = segment[:k]; i += k
+        if i >= n: break
+        x = low if segment[k] < low else high; out[i] = x; i += 1
+        pushing = deltas[i:] <= 0 if x == low else deltas[i:] >= 0
+        m = len(pushing) if pushing.all() else int(np.argmin(pushing))
+        out[i:i + m] = x; i += m
+    return out
+
+def battery_status(net_power_kw, battery_kwh, capacity_kwh):
+    if net_power_kw > 0: return "CARGA MÁXIMA" if battery_kwh >= capacity_kwh else "CARREGANDO"
+    return "SEM ENERGIA" if battery_kwh <= 0 and net_power_kw < 0 else "DESCARREGANDO"
+
+class BatterySimulator:
+    """Bateria + carga da fazenda integradas em passo fixo sobre um relógio simulado (dia e hora do dia).
+    O consumo é load_kw constante ou, com load_profile_kw, uma função das horas absolutas (dia * 24 + hora)."""
+    def __init__(self, capacity_kwh=50., current_kwh=40., max_charge_kw=15., load_kw=2., hour=12., step_seconds=1., max_frame_seconds=0.25, load_profile_kw=None, day=0):
+        self.capacity_kwh, self.current_kwh, self.max_charge_kw, self.load_kw = capacity_kwh, current_kwh, max_charge_kw, load_kw
+        self.hour = hour; self.day = day; self.elapsed_hours = 0.; self.step_seconds = step_seconds; self.max_frame_seconds = max_frame_seconds
+        self.load_profile_kw = load_profile_kw; self.current_load_kw = load_kw
+        self.speed = 1; self.status = "DESCARREGANDO"; self.net_power_kw = 0.; self._accumulator = 0.
+    @property
+    def percentage(self): return (self.current_kwh / self.capacity_kwh) * 100
+    @property
+    def absolute_hour(self): return self.day * 24. + self.hour
+    def change_speed(self, direction):
+        index = min(max(TIME_SPEEDS.index(self.speed) + direction, 0), len(TIME_SPEEDS) - 1); self.speed = TIME_SPEEDS[index]
+    def advance(self, real_seconds, generation_kw):
+        """Avança o relógio pelo tempo real do quadro vezes a aceleração; devolve quantos passos rodaram.
+        O tempo real é limitado a max_frame_seconds para um quadro travado não virar horas simuladas."""
+        self._accumulator += min(real_seconds, self.max_frame_seconds) * self.speed
+        n_steps = int(self._accumulator // self.step_seconds)
+        if n_steps: self._accumulator -= n_steps * self.step_seconds; self.step(n_steps, generation_kw)
+        return n_steps
+    def step(self, n_steps, generation_kw):
+        """Roda n_steps passos fixos; generation_kw(horas) devolve a geração em kW para um array de horas absolutas
+        (dia * 24 + hora; os modelos de hora do dia tomam o resto por 24). Devolve a carga da bateria (kWh) ao fim
+        de cada passo e a potência líquida (kW) de cada passo."""
+        step_hours = self.step_seconds / 3600.
+        hours = self.absolute_hour + step_hours * np.arange(n_steps)
+        load = np.asarray(self.load_profile_kw(hours), dtype=np.float64) if self.load_profile_kw is not None else self.load_kw
+        net = np.asarray(generation_kw(hours), dtype=np.float64) - load
+        deltas = np.where(net > 0, np.minimum(net, self.max_charge_kw), net) * step_hours
+        battery_kwh = saturating_cumsum(self.current_kwh, deltas, 0., self.capacity_kwh); self.current_kwh = float(battery_kwh[-1])
+        self.net_power_kw = float(net[-1]); self.status = battery_status(self.net_power_kw, self.current_kwh, self.capacity_kwh)
+        self.current_load_kw = float(np.ravel(load)[-1])
+        end = self.hour + n_steps * step_hours; self.day += int(end // 24.); self.hour = end % 24.; self.elapsed_hours += n_steps * step_hours
+        return battery_kwh, net
+    def run_hours(self, hours, generation_kw, chunk_steps=86400):
+        """Avanço sem renderização (scripts e varreduras), em blocos de até chunk_steps passos."""
+        remaining = int(round(hours * 3600. / self.step_seconds))
+        while remaining > 0:
+            n_steps = min(remaining, chunk_steps); self.step(n_steps, generation_kw); remaining -= n_steps
@@ -0,0 +1,120 @@
+import argparse
+import functools
+import numpy as np
+import pytest
+import efemerides
+import medicoes
+
+def write_csv(path, header, rows):
+    path.write_text('\n'.join([header] + [','.join(str(v) for v in row) for row in rows]) + '\n', encoding='utf-8')
+    return str(path)
+
+def minute_load(tmp_path, days=2):
+    # Consumo minuto a minuto: o valor é a hora do dia, em horas fracionárias
+    t = np.datetime64('2020-03-01T00:00') + np.arange(days * 1440)
+    return write_csv(tmp_path / 'consumo.csv', 'timestamp,load_kw', [(str(s).replace('T', ' '), (i % 1440) / 60.) for i, s in enumerate(t)])
+
+def hourly_weather(tmp_path, ghi):
+    t = np.datetime64('2021-06-01T00:00') + np.arange(len(ghi)) * 60
+    return write_csv(tmp_path / 'clima.csv', 'time,ghi', [(str(s), g) for s, g in zip(t, ghi)])
+
+def test_native_step_is_default(tmp_path):
+    series = medicoes.ingest_csv(hourly_weather(tmp_path, [0.] * 15 + [1000., 500.]), cache_dir=str(tmp_path / 'cache'))
+    assert series.step_minutes == 60 and series.length == 17
+    assert series.sample('ghi', np.array([15., 15.5])).tolist() == [1000., 750.]
+
+def test_coarser_step_averages_bins(tmp_path):
+    series = medicoes.ingest_csv(minute_load(tmp_path), step_minutes=60, cache_dir=str(tmp_path / 'cache'))
+    assert series.step_minutes == 60 and series.length == 49
+    # Célula i é a média dos minutos de i h - 30 min a i h + 29 min
+    column = np.asarray(series.columns['load_kw'])
+    np.testing.assert_allclose(column[1:23], np.arange(1, 23) - 0.5 / 60., atol=1e-4)
+    assert np.isfinite(column).all()
+
+def test_finer_step_interpolates(tmp_path):
+    series = medicoes.ingest_csv(hourly_weather(tmp_path, [0.] * 15 + [1000., 0.]), step_minutes=1, cache_dir=str(tmp_path / 'cache'))
+    assert series.step_minutes == 1 and series.length == 16 * 60 + 1
+    np.testing.assert_allclose(series.sample('ghi', np.array([15., 15.25, 15.5, 14. + 10 / 60.])), [1000., 750., 500., 1000. / 6.], atol=1e-3)
+
+def test_finer_step_keeps_measurement_gaps(tmp_path):
+    ghi = [100.] * 6 + [''] * 3 + [300.] * 6
+    series = medicoes.ingest_csv(hourly_weather(tmp_path, ghi), step_minutes=15, cache_dir=str(tmp_path / 'cache'))
+    # Amostras vizinhas (1 h) são interpoladas; o buraco de 4 h entre 5:00 e 9:00 continua vazio
+    assert series.sample('ghi', np.array([2.25])).tolist() == [100.]
+    assert series.sample('ghi', np.array([7.]), fill=-1.).tolist() == [-1.]
+
+def test_utc_series_shift_to_local_time(tmp_path):
+    # PVGIS: 'time(UTC)' AAAAMMDD:HHMM; às 15:00 UTC são 12:00 em UTC-3
+    rows = [(f'20210601:{h:02d}00', 1000. if h == 15 else 0.) for h in range(24)]
+    series = medicoes.ingest_csv(write_csv(tmp_path / 'pvgis.csv', 'time(UTC),G(h)', rows), utc_offset=-3, cache_dir=str(tmp_path / 'cache'))
+    assert series.utc_offset_minutes == 0
+    assert series.sample('ghi', np.array([12., 15.])).tolist() == [1000., 0.]
+    assert series.timestamp(12.) == np.datetime64('2021-06-01T12:00')
+
+def test_nsrdb_parts_are_utc(tmp_path):
+    rows = [(2021, 6, 1, h, 0, 1000. if h == 15 else 0.) for h in range(24)]
+    series = medicoes.ingest_csv(write_csv(tmp_path / 'nsrdb.csv', 'Year,Month,Day,Hour,Minute,GHI', rows), utc_offset=-3, cache_dir=str(tmp_path / 'cache'))
+    assert series.sample('ghi', np.array([12.])).tolist() == [1000.]
+
+def test_iso_offsets_are_honoured(tmp_path):
+    # A mesma medição escrita em fusos diferentes cai no mesmo instante
+    rows = [('2021-06-01T10:00:00-03:00', 500.), ('2021-06-01T14:00Z', 800.), ('2021-06-01 18:00:00+02:00', 200.)]
+    series = medicoes.ingest_csv(write_csv(tmp_path / 'iso.csv', 'timestamp,ghi', rows), utc_offset=-3, cache_dir=str(tmp_path / 'cache'))
+    assert series.utc_offset_minutes == 0 and series.step_minutes == 60
+    assert series.sample('ghi', np.array([10., 11., 13.])).tolist() == [500., 800., 200.]
+
+def test_local_series_ignore_utc_offset(tmp_path):
+    series = medicoes.ingest_csv(hourly_weather(tmp_path, [0.] * 15 + [1000.]), utc_offset=-3, cache_dir=str(tmp_path / 'cache'))
+    assert series.utc_offset_minutes is None
+    assert series.sample('ghi', np.array([15.])).tolist() == [1000.]
+
+def open_args(tmp_path, monkeypatch, *argv):
+    # open_data com o cache das séries no diretório temporário do teste
+    monkeypatch.setattr(medicoes, 'ingest_csv', functools.partial(medicoes.ingest_csv, cache_dir=str(tmp_path / 'cache')))
+    parser = argparse.ArgumentParser(); medicoes.add_data_arguments(parser)
+    return medicoes.open_data(parser.parse_args(list(argv)), parser)
+
+def daily_series(tmp_path, name, column, first_day, days):
+    # Uma amostra ao meio-dia de cada dia, com o valor = dia do ano da data
+    t = np.datetime64(first_day) + np.arange(days)
+    rows = [(f'{d}T12:00', int((d - d.astype('datetime64[Y]')).astype(np.int64)) + 1) for d in t]
+    return write_csv(tmp_path / f'{name}.csv', f'timestamp,{column}', rows)
+
+def test_same_day_in_year():
+    assert medicoes._same_day_in_year(np.datetime64('2021-12-01'), 2001) == np.datetime64('2001-12-01')
+    assert medicoes._same_day_in_year(np.datetime64('2020-02-29'), 2021) == np.datetime64('2021-02-28')
+
+def test_load_follows_weather_calendar(tmp_path, monkeypatch):
+    weather_csv = daily_series(tmp_path, 'clima', 'ghi', '2021-01-01', 365)
+    # De março de 2020 a março de 2021: o dia 0 do clima, 01/01/2021, está no consumo
+    load_csv = daily_series(tmp_path, 'consumo', 'load_kw', '2020-03-01', 380)
+    weather, load, sun, generation = open_args(tmp_path, monkeypatch, '--clima', weather_csv, '--consumo', load_csv)
+    hours = np.array([12., 24. * 30 + 12.])
+    assert weather.sample('ghi', hours).tolist() == [1., 31.] and load.sample('load_kw', hours).tolist() == [1., 31.]
+    assert str(load.timestamp(hours[1])) == str(weather.timestamp(hours[1])) == '2021-01-31T12:00'
+
+def test_load_of_another_year_uses_same_month_and_day(tmp_path, monkeypatch):
+    weather_csv = daily_series(tmp_path, 'clima', 'ghi', '2021-06-01', 30)
+    load_csv = daily_series(tmp_path, 'consumo', 'load_kw', '2019-01-01', 365)
+    weather, load, sun, generation = open_args(tmp_path, monkeypatch, '--clima', weather_csv, '--consumo', load_csv)
+    assert str(load.timestamp(36.)) == '2019-06-02T12:00' and str(weather.timestamp(36.)) == '2021-06-02T12:00'
+
+def test_data_moves_weather_with_the_sun(tmp_path, monkeypatch):
+    weather_csv = daily_series(tmp_path, 'clima', 'ghi', '2021-01-01', 365)
+    weather, load, sun, generation = open_args(tmp_path, monkeypatch, '--clima', weather_csv, '--data', '2021-12-01', '--latitude', '-15.78', '--longitude', '-47.93')
+    # Dia 0 = 01/12/2021 para o sol e para o clima (dia 335 do ano)
+    assert str(weather.timestamp(12.)) == '2021-12-01T12:00' and weather.sample('ghi', np.array([12.])).tolist() == [335.]
+    assert sun.year == 2021 and np.datetime64('2021-01-01') + sun.start_day == np.datetime64('2021-12-01')
+    elevation = sun.elevation_azimuth(np.array([12.]))[0][0]
+    expected = efemerides.solar_position(np.datetime64('2021-12-01T15:00').astype('datetime64[m]').astype(np.int64), -15.78, -47.93)[0]
+    assert abs(elevation - expected) < 0.5
+
+def test_typical_year_weather_follows_data_by_month_and_day(tmp_path, monkeypatch):
+    weather_csv = daily_series(tmp_path, 'clima', 'ghi', '2001-01-01', 365)
+    weather, load, sun, generation = open_args(tmp_path, monkeypatch, '--clima', weather_csv, '--data', '2021-12-01', '--latitude', '-15.78', '--longitude', '-47.93')
+    assert str(weather.timestamp(12.)) == '2001-12-01T12:00' and np.datetime64('2021-01-01') + sun.start_day == np.datetime64('2021-12-01')
+
+def test_data_outside_weather_is_rejected(tmp_path, monkeypatch):
+    weather_csv = daily_series(tmp_path, 'clima', 'ghi', '2021-06-01', 30)
+    with pytest.raises(SystemExit):
+        open_args(tmp_path, monkeypatch, '--clima', weather_csv, '--data', '2021-12-01')
@@ -0,0 +1,59 @@
+"""Texto do HUD: atlas de glifos e montagem dos quads, sem OpenGL.
+
+GlyphAtlas rasteriza uma vez, com pygame.freetype, os caracteres usados pelo HUD numa única imagem de alfa;
+HudText guarda os vértices de cada linha (um quad por glifo) e só refaz os das linhas cujo texto ou posição
+mudaram, juntando tudo num só array para o simulador desenhar o HUD inteiro numa chamada.
+"""
+import numpy as np
+
+# ASCII imprimível, os acentos do português e os símbolos das unidades do HUD (°C, W/m²); o resto vira '?'
+ATLAS_CHARS = ''.join(chr(c) for c in range(32, 127)) + 'ÀÁÂÃÇÉÊÍÓÔÕÚÜàáâãçéêíóôõúü°ºª·²'
+FLOATS_PER_VERTEX = 4  # x, y (pixels, y para baixo) e u, v
+
+class GlyphAtlas:
+    """Glifos de `font` empacotados em prateleiras numa imagem (altura, largura) uint8 de alfa, com as métricas de cada um."""
+    def __init__(self, font, chars=ATLAS_CHARS, width=512, padding=1):
+        self.ascender = font.get_sized_ascender(); self.line_height = font.get_sized_height()
+        glyphs = []; x = y = shelf = 0
+        for ch in chars:
+            rect = font.get_rect(ch); raw, (w, h) = font.render_raw(ch); advance = font.get_metrics(ch)[0][4]
+            if x + w + padding > width: x = 0; y += shelf + padding; shelf = 0
+            glyphs.append((ch, x, y, w, h, rect.x, rect.y, advance, raw)); x += w + padding; shelf = max(shelf, h)
+        height = 1 << max(0, int(np.ceil(np.log2(y + shelf + 1))))
+        self.image = np.zeros((height, width), dtype=np.uint8)
+        # Por caractere: retângulo no atlas (u0, v0, u1, v1), deslocamento do quad em relação à caneta na linha de base e avanço
+        self.index = {}; self.uv = np.zeros((len(glyphs), 4), dtype=np.float32)
+        self.offset = np.zeros((len(glyphs), 4), dtype=np.float32); self.advance = np.zeros(len(glyphs), dtype=np.float32)
+        for i, (ch, gx, gy, w, h, bearing_x, top, advance, raw) in enumerate(glyphs):
+            if w and h: self.image[gy:gy + h, gx:gx + w] = np.frombuffer(raw, dtype=np.uint8).reshape(h, w)
+            self.index[ch] = i; self.uv[i] = (gx / width, gy / height, (gx + w) / width, (gy + h) / height)
+            self.offset[i] = (bearing_x, -top, bearing_x + w, h - top); self.advance[i] = advance
+        self.fallback = self.index['?']
+    def layout(self, text, x, y):
+        """Vértices (6 por glifo, em triângulos) do texto com o canto superior esquerdo da linha em (x, y)."""
+        if not text: return np.zeros((0, FLOATS_PER_VERTEX), dtype=np.float32)
+        ids = np.array([self.index.get(ch, self.fallback) for ch in text])
+        pen = x + np.concatenate([[0.], np.cumsum(self.advance[ids])[:-1]]); baseline = y + self.ascender
+        x0, y0, x1, y1 = (self.offset[ids] + np.stack([pen, np.full_like(pen, baseline)] * 2, axis=1)).T
+        u0, v0, u1, v1 = self.uv[ids].T
+        corners = [(x0, y0, u0, v0), (x0, y1, u0, v1), (x1, y1, u1, v1), (x0, y0, u0, v0), (x1, y1, u1, v1), (x1, y0, u1, v0)]
+        return np.stack([np.stack(c, axis=-1) for c in corners], axis=1).reshape(-1, FLOATS_PER_VERTEX).astype(np.float32)
+
+class HudText:
+    """Linhas do HUD indexadas por chave; set_line só refaz os vértices da linha quando o texto ou a posição mudam."""
+    def __init__(self, atlas):
+        self.atlas = atlas; self.lines = {}; self.dirty = True; self._vertices = None
+    def set_line(self, key, text, pos):
+        line = self.lines.get(key)
+        if line is not None and line[0] == text and line[1] == pos: return False
+        self.lines[key] = (text, pos, self.atlas.layout(text, *pos)); self.dirty = True
+        return True
+    def remove_line(self, key):
+        if self.lines.pop(key, None) is not None: self.dirty = True
+    def vertices(self):
+        """Todos os vértices do HUD num array contíguo; só é refeito (e dirty volta a False) quando alguma linha mudou."""
+        if self.dirty:
+            parts = [line[2] for line in self.lines.values()]
+            self._vertices = np.ascontiguousarray(np.concatenate(parts) if parts else np.zeros((0, FLOATS_PER_VERTEX), dtype=np.float32))
+            self.dirty = False
+        return self._vertices
@@ -0,0 +1,49 @@
+"""Decodificação das texturas e cache pré-processado, sem OpenGL.
+
+decode_texture devolve a cadeia de mipmaps RGBA de uma imagem. Na primeira vez o PNG é decodificado
+com PIL e os níveis são calculados por média 2x2; o resultado vai para .cache/textures/ num único .npy,
+que nas partidas seguintes é aberto com memória mapeada, sem decodificar o PNG.
+Pode ser chamada de threads de trabalho; o envio ao OpenGL fica com o laço principal.
+"""
+import hashlib
+import os
+import numpy as np
+from PIL import Image
+
+TEXTURE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'textures')
+
+def build_mip_chain(rgba):
+    """Níveis de mipmap (nível 0 incluso) por média 2x2 até 1x1; dimensões ímpares descartam a última linha/coluna."""
+    levels = [rgba]
+    while levels[-1].shape[0] > 1 or levels[-1].shape[1] > 1:
+        level = levels[-1]; h, w = level.shape[:2]
+        fh, fw = (2 if h > 1 else 1), (2 if w > 1 else 1); h2, w2 = h // fh, w // fw
+        blocks = level[:h2 * fh, :w2 * fw].reshape(h2, fh, w2, fw, 4).astype(np.uint16)
+        levels.append(((blocks.sum(axis=(1, 3)) + (fh * fw) // 2) // (fh * fw)).astype(np.uint8))
+    return levels
+
+def _cache_key(path):
+    stat = os.stat(path)
+    return hashlib.sha1(f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}'.encode()).hexdigest()[:16]
+
+def decode_texture(path):
+    """(níveis de mipmap, veio_do_cache). Cada nível é um array (altura, largura, 4) uint8, linha 0 no topo da imagem."""
+    cache_path = os.path.join(TEXTURE_CACHE_DIR, f'{os.path.splitext(os.path.basename(path))[0]}_{_cache_key(path)}.npy')
+    try:
+        data = np.load(cache_path, mmap_mode='r')
+        # Cabeçalho: número de níveis seguido de (altura, largura) de cada nível, gravados como bytes no início do arquivo
+        n_levels = int(data[:8].view(np.int64)[0]); shapes = data[8:8 + 16 * n_levels].view(np.int64).reshape(n_levels, 2)
+        levels = []; offset = 8 + 16 * n_levels
+        for h, w in shapes:
+            levels.append(data[offset:offset + h * w * 4].reshape(h, w, 4)); offset += h * w * 4
+        return levels, True
+    except (OSError, ValueError): pass
+    with Image.open(path) as img: rgba = np.asarray(img.convert("RGBA"))
+    levels = build_mip_chain(rgba)
+    header = np.array([len(levels)] + [d for level in levels for d in level.shape[:2]], dtype=np.int64).view(np.uint8)
+    try:
+        os.makedirs(TEXTURE_CACHE_DIR, exist_ok=True); temp_path = f'{cache_path}.{os.getpid()}.{id(levels)}.tmp'
+        with open(temp_path, 'wb') as f: np.save(f, np.concatenate([header] + [level.ravel() for level in levels]))
+        os.replace(temp_path, cache_path)
+    except OSError: pass
+    return levels, False
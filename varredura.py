@@ -0,0 +1,121 @@
+"""Varredura do espaço de projeto: inclinação x azimute x tipo de painel x fileiras x colunas.
+
+Cada configuração é avaliada com o mesmo modelo do simulador (geracao.py, sombreamento de arranjo.py
+e a bateria de simulacao.py). As configurações são divididas em lotes distribuídos por um pool de
+processos, e os resultados vão sendo gravados em CSV (ou Parquet, com pyarrow) à medida que chegam.
+
+Exemplo:
+    python varredura.py --inclinacoes 0:60:5 --azimutes 0:355:5 --fileiras 1,2,4 --colunas 3,6,10 --saida resultados.csv
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool
+import numpy as np
+from geracao import PAINEL_SPECS, PANEL_REFERENCE_POINT, sun_positions, power_series_kw
+from arranjo import PanelGrid, update_panel_positions, shaded_fractions
+from simulacao import BatterySimulator
+
+COLUMNS = ['painel_w', 'fileiras', 'colunas', 'n_paineis', 'inclinacao', 'azimute', 'energia_anual_kwh', 'kwh_por_painel', 'sombreamento_medio_pct', 'autonomia_pct', 'horas_sem_energia']
+
+def parse_values(text, cast=float):
+    """'0:60:10' (início:fim:passo, fim incluso) ou lista '160,330,610'."""
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        return [cast(v) for v in np.arange(start, stop + step / 2., step)]
+    return [cast(v) for v in text.split(',')]
+
+def evaluate(config, options):
+    wattage, rows, cols, tilt, azimuth = config
+    positions = update_panel_positions(rows, cols); size = PAINEL_SPECS[wattage]['size']
+    # O sol do modelo repete o mesmo percurso todo dia: um dia na resolução pedida vale para o ano inteiro
+    step_hours = options['step_minutes'] / 60.; hours = np.arange(0., 24., step_hours)
+    sun = sun_positions(hours); lit = np.full(len(hours), float(len(positions)))
+    grid = PanelGrid(positions, 2. * np.hypot(size[0] / 2., size[2] / 2.))
+    for k in np.flatnonzero(sun[:, 1] > 0):
+        lit[k] -= shaded_fractions(positions, size, tilt, azimuth, sun[k] - PANEL_REFERENCE_POINT, grid=grid).sum()
+    day_kw = power_series_kw(hours, tilt, azimuth, wattage, 1) * lit
+    energy_kwh = day_kw.sum() * step_hours * 365
+    battery = BatterySimulator(capacity_kwh=options['capacity_kwh'], current_kwh=options['initial_kwh'], max_charge_kw=options['max_charge_kw'], load_kw=options['load_kw'], step_seconds=options['step_minutes'] * 60.)
+    generation_kw = lambda h: np.interp(h, hours, day_kw, period=24.)
+    unserved_steps = total_steps = 0
+    for _ in range(options['battery_days']):
+        battery_kwh, net = battery.step(len(hours), generation_kw)
+        unserved_steps += np.count_nonzero((battery_kwh <= 0) & (net < 0)); total_steps += len(net)
+    unlit = len(positions) * np.count_nonzero(sun[:, 1] > 0) - lit[sun[:, 1] > 0].sum()
+    daylight = len(positions) * max(1, np.count_nonzero(sun[:, 1] > 0))
+    return [wattage, rows, cols, len(positions), tilt, azimuth, round(energy_kwh, 3), round(energy_kwh / len(positions), 3),
+            round(100. * unlit / daylight, 3), round(100. * (1. - unserved_steps / max(1, total_steps)), 3), round(unserved_steps * step_hours, 3)]
+
+def evaluate_chunk(args):
+    chunk, options = args
+    return [evaluate(config, options) for config in chunk]
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk: return
+        yield chunk
+
+class ResultWriter:
+    """Grava as linhas à medida que chegam: CSV direto, ou Parquet com um row group por lote."""
+    def __init__(self, path):
+        self.path = path; self.parquet = path.endswith('.parquet')
+        if self.parquet:
+            try: import pyarrow, pyarrow.parquet
+            except ImportError: print("ERRO: saída Parquet precisa do pacote pyarrow (pip install pyarrow)"); sys.exit(1)
+            self.pa = pyarrow; self.writer = None
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8'); self.writer = csv.writer(self.file); self.writer.writerow(COLUMNS)
+    def write(self, rows):
+        if not self.parquet: self.writer.writerows(rows); return
+        table = self.pa.Table.from_pylist([dict(zip(COLUMNS, row)) for row in rows])
+        if self.writer is None: self.writer = self.pa.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+    def close(self):
+        if self.parquet:
+            if self.writer is not None: self.writer.close()
+        else: self.file.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Varredura de configurações da fazenda solar")
+    parser.add_argument('--inclinacoes', default='0:60:10', help="inclinações em graus (início:fim:passo ou lista)")
+    parser.add_argument('--azimutes', default='0:345:15', help="azimutes em graus (início:fim:passo ou lista)")
+    parser.add_argument('--paineis', default='160,330,610', help="potências de PAINEL_SPECS")
+    parser.add_argument('--fileiras', default='2', help="números de fileiras")
+    parser.add_argument('--colunas', default='3', help="números de colunas")
+    parser.add_argument('--passo-minutos', type=float, default=15., help="passo de tempo da simulação")
+    parser.add_argument('--dias-bateria', type=int, default=7, help="dias simulados para a autonomia da bateria")
+    parser.add_argument('--capacidade', type=float, default=50., help="capacidade da bateria (kWh)")
+    parser.add_argument('--carga-inicial', type=float, default=40., help="carga inicial da bateria (kWh)")
+    parser.add_argument('--carga-max', type=float, default=15., help="potência máxima de carga (kW)")
+    parser.add_argument('--consumo', type=float, default=2., help="consumo da fazenda (kW)")
+    parser.add_argument('--processos', type=int, default=os.cpu_count(), help="processos do pool")
+    parser.add_argument('--lote', type=int, default=16, help="configurações por unidade de trabalho")
+    parser.add_argument('--saida', default='varredura.csv', help="arquivo .csv ou .parquet")
+    args = parser.parse_args(argv)
+    wattages = parse_values(args.paineis, int)
+    for wattage in wattages:
+        if wattage not in PAINEL_SPECS: parser.error(f"painel {wattage}W não existe em PAINEL_SPECS")
+    configs = itertools.product(wattages, parse_values(args.fileiras, int), parse_values(args.colunas, int), parse_values(args.inclinacoes), parse_values(args.azimutes))
+    options = {'step_minutes': args.passo_minutos, 'battery_days': args.dias_bateria, 'capacity_kwh': args.capacidade, 'initial_kwh': args.carga_inicial,
+               'max_charge_kw': args.carga_max, 'load_kw': args.consumo}
+    writer = ResultWriter(args.saida); best_yield = best_autonomy = None; count = 0; start = time.perf_counter()
+    with Pool(args.processos) as pool:
+        # imap_unordered com lotes: cada processo recebe unidades de trabalho independentes e nada é compartilhado
+        for rows in pool.imap_unordered(evaluate_chunk, ((chunk, options) for chunk in chunked(configs, args.lote))):
+            writer.write(rows); count += len(rows)
+            for row in rows:
+                if best_yield is None or row[6] > best_yield[6]: best_yield = row
+                if best_autonomy is None or (row[9], row[6]) > (best_autonomy[9], best_autonomy[6]): best_autonomy = row
+    writer.close(); elapsed = time.perf_counter() - start
+    print(f"{count} configurações em {elapsed:.1f} s ({count / max(elapsed, 1e-9):.0f}/s, {args.processos} processos) -> {args.saida}")
+    for title, row in (("Maior geração", best_yield), ("Maior autonomia", best_autonomy)):
+        if row: print(f"{title}: {row[0]}W, {row[1]}x{row[2]} painéis, inclinação {row[4]:.1f}°, azimute {row[5]:.1f}° -> {row[6]:.1f} kWh/ano, autonomia {row[9]:.1f}%")
+
+if __name__ == '__main__':
+    main()